@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+# Columns of the disaster dataset that are summed into the cube
+EVENT_METRICS = [
+    "Total Deaths",
+    "No Injured",
+    "No Affected",
+    "No Homeless",
+    "Total Damages, Adjusted ('000 US$)",
+    "Reconstruction Costs, Adjusted ('000 US$)",
+    "Insured Damages, Adjusted ('000 US$)"
+]
+
+# Extra metrics: the gdp share of the damages and the number of events
+METRICS = EVENT_METRICS + ["share", "count"]
+
+KEYS = ["Start Year", "ISO", "Disaster Subgroup", "Disaster Type"]
+
+def build_cube(df_disasters, df_gdp):
+    # Every axis of the cube is the sorted union of the values in both datasets
+    years = np.arange(min(df_disasters["Start Year"].min(), df_gdp["Start Year"].min()),
+                      max(df_disasters["Start Year"].max(), df_gdp["Start Year"].max()) + 1)
+    isos = np.union1d(df_disasters["ISO"].dropna().unique(), df_gdp["ISO"].dropna().unique())
+    classes = pd.concat([df_disasters[KEYS[2:]], df_gdp[KEYS[2:]]]).dropna().drop_duplicates()
+    classes = pd.MultiIndex.from_frame(classes).sort_values()
+    subgroups = np.array(sorted(classes.get_level_values(0).unique()))
+
+    totals = np.zeros((len(years), len(isos), len(classes), len(METRICS)))
+
+    def add(df, metrics, values):
+        df = df.dropna(subset=KEYS)
+        year_idx = df["Start Year"].to_numpy(dtype=int) - years[0]
+        iso_idx = np.searchsorted(isos, df["ISO"].to_numpy())
+        class_idx = classes.get_indexer(pd.MultiIndex.from_frame(df[KEYS[2:]]))
+        metric_idx = [METRICS.index(metric) for metric in metrics]
+        values = np.nan_to_num(values(df).astype(float))
+        for column, metric in enumerate(metric_idx):
+            np.add.at(totals, (year_idx, iso_idx, class_idx, metric), values[:, column])
+
+    add(df_disasters, EVENT_METRICS, lambda df: df[EVENT_METRICS].to_numpy())
+    add(df_disasters, ["count"], lambda df: np.ones((len(df), 1)))
+    add(df_gdp, ["share"], lambda df: df[["share"]].to_numpy())
+
+    # Map every disaster type to the index of its subgroup
+    class_subgroup = np.searchsorted(subgroups, classes.get_level_values(0))
+
+    return {
+        "years": years,
+        "isos": isos,
+        "classes": classes,
+        "subgroups": subgroups,
+        "class_subgroup": class_subgroup,
+        "gdp_isos": set(df_gdp["ISO"].dropna().unique()),
+        "totals": totals,
+        # World totals are requested all the time so keep them precomputed
+        "world": totals.sum(axis=1),
+        # Dense (year x subgroup x metric) time series per scope, filled on first use
+        "series": {}
+    }
+
+def get_scope(cube, country_code = None):
+    # Returns a (year x class x metric) view for the world or a single country
+    if not country_code:
+        return cube["world"]
+    idx = np.searchsorted(cube["isos"], country_code)
+    if idx < len(cube["isos"]) and cube["isos"][idx] == country_code:
+        return cube["totals"][:, idx]
+    return np.zeros(cube["world"].shape)
+
+def has_gdp_data(cube, country_code = None):
+    return not country_code or country_code in cube["gdp_isos"]
+
+def year_index(cube, year):
+    return int(np.clip(year - cube["years"][0], -1, len(cube["years"]) - 1))
+
+def per_subgroup(cube, scope):
+    # Collapse the disaster types of a scope into their subgroups: (year x subgroup x metric)
+    result = np.zeros((scope.shape[0], len(cube["subgroups"]), scope.shape[2]))
+    np.add.at(result, (slice(None), cube["class_subgroup"]), scope)
+    return result
+
+def get_yearly_totals(cube, year, country_code = None):
+    # Totals of every metric for a single year, summed over all disaster types
+    idx = year_index(cube, year)
+    if idx < 0 or cube["years"][idx] != year:
+        return dict.fromkeys(METRICS, 0.0)
+    values = get_scope(cube, country_code)[idx].sum(axis=0)
+    return dict(zip(METRICS, values.tolist()))
+
+def get_subgroup_timeseries(cube, country_code = None):
+    # Every year and subgroup is present, so graphs never have to fill gaps
+    if country_code not in cube["series"]:
+        cube["series"][country_code] = per_subgroup(cube, get_scope(cube, country_code))
+    return cube["series"][country_code]
+
+def get_subgroup_series(cube, metrics, current_year, country_code = None):
+    # Long format dataframe with one row per (year, subgroup) up until the current year
+    years = cube["years"][:year_index(cube, current_year) + 1]
+    subgroups = cube["subgroups"]
+    values = get_subgroup_timeseries(cube, country_code)[:len(years), :, [METRICS.index(metric) for metric in metrics]]
+
+    series = pd.DataFrame(values.reshape(-1, len(metrics)), columns=metrics)
+    series.insert(0, "Disaster Subgroup", np.tile(subgroups, len(years)))
+    series.insert(0, "Start Year", np.repeat(years, len(subgroups)))
+    return series
+
+def build_admin1_counts(df_disasters):
+    # Number of events of every admin-1 region (GID_1, filled by geocoding.py) per country, over all years
+    if "GID_1" not in df_disasters.columns:
+        return {}
+    counts = df_disasters.groupby(["ISO", "GID_1"], observed=True).size()
+    return {iso: {gid: int(count) for gid, count in group.droplevel(0).items()}
+            for iso, group in counts.groupby(level=0, observed=True)}
+
+def get_admin1_counts(admin1_counts, country_code):
+    return admin1_counts.get(country_code, {})
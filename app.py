@@ -1,10 +1,12 @@
 import pandas as pd
 import dash_leaflet as dl
 import dash_bootstrap_components as dbc
-from dash import Dash, html, Input, Output, State
+from dash import Dash, html, Input, Output, State, ClientsideFunction, ALL, ctx, no_update
 from dash_extensions.javascript import Namespace
 from flask import Flask
 import json
+import os
+import gc
 
 import util
 import components
@@ -13,6 +15,9 @@ import callbacks
 import us_layout
 import home_layout
 import data
+import geojson_server
+import figure_cache
+import metrics
 
 # Colormap for graphs
 EVENT_COLOURS = {
@@ -31,8 +36,6 @@ DISASTER_SUBGROUPS = [
 
 ns = Namespace("dashExtensions", "default")
 
-current_state = None
-
 # fig = px.scatter(
 #     data_frame=disaster_data,
 #     x='Longitude',
@@ -50,6 +53,15 @@ server = Flask("Natural Disasters Dashboard")
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True, prevent_initial_callbacks='initial_duplicate')
 server=app.server
 
+# Boundary files are served by the Flask server, so browsers can cache them instead of receiving them with every layout
+geojson_server.register_routes(server)
+
+# The gdp and affected figures are cached in memory and on disk, many users look at the same years
+figure_cache.init_app(server)
+
+# Latency and payload sizes of the callbacks, memory of the datasets and cache hit rates, for Prometheus
+metrics.register_routes(server, app.callback_map)
+
 ################
 #              #
 #  COMPONENTS  #
@@ -70,8 +82,6 @@ tabs = dbc.Tabs(
 #          #
 ############
 
-geojson = dl.GeoJSON(data=util.get_world_geojson())
-
 app.layout = html.Div(
     children=[
         tabs,
@@ -92,9 +102,9 @@ app.layout = html.Div(
               Input("tabs", "active_tab"))
 def navigate_tabs(active_tab):
     if active_tab == "home":
-        return home_layout.home_layout
+        return home_layout.create_home_layout()
     elif active_tab == "us-prevention":
-        return us_layout.us_layout
+        return us_layout.create_us_layout()
 
 # Callback that disables the dragging of the map when hovering over the slider container, to prevent dragging the map when dragging the slider
 @app.callback(Output("map", "dragging"), 
@@ -109,197 +119,283 @@ def hover_slider(n_events, e):
     else:
         return True
 
-# Callback to animate the slider on the main page
+# Callback to animate the slider on the main page, the data of all years is sent once when the animation starts
 @app.callback(Output('animation-interval', 'disabled'),
+              Output('world-animation-bundle', 'data'),
               Input('world-animation-button', 'n_clicks'),
-              State('animation-interval', 'disabled'),
+              [State('animation-interval', 'disabled'),
+               State('world-animation-bundle', 'data'),
+               State('world-year-slider', 'min'),
+               State('world-year-slider', 'max')],
               prevent_initial_call=True)
-def animate_slider(n_clicks, animation_status):
-    return not animation_status
-
-# Callback to update the value of the slider on the main page
-@app.callback(Output('world-year-slider', 'value'),
-              Input('animation-interval', 'n_intervals'),
-              [State('world-year-slider', 'value'),
-               State('world-year-slider', 'max'),
-               State('world-year-slider', 'min')],
-               prevent_initial_call=True)
-def update_slider(_n_clicks, current_slider_value, max, min):
-    if (current_slider_value < max):
-        return current_slider_value + 1
-    else:
-        # or min if we want replay, maybe second button to allow for loops ?
-        return current_slider_value
+def animate_slider(n_clicks, animation_status, bundle, min, max):
+    if animation_status and bundle is None:
+        bundle = callbacks.create_animation_bundle(data.disaster_index, data.cube, list(range(min, max + 1)))
+        return not animation_status, bundle
+    return not animation_status, no_update
+
+# Callback to update the value of the slider on the main page, runs in the browser
+app.clientside_callback(ClientsideFunction(namespace='animation', function_name='next_year'),
+                        Output('world-year-slider', 'value'),
+                        Input('animation-interval', 'n_intervals'),
+                        [State('world-year-slider', 'value'),
+                         State('world-year-slider', 'max')],
+                        prevent_initial_call=True)
+
+# Callback to load the world borders of the level of detail of the zoom level when the map is zoomed, runs in the browser
+app.clientside_callback(ClientsideFunction(namespace='boundaries', function_name='world_url'),
+                        Output('countries', 'url'),
+                        Input('map', 'zoom'),
+                        [State('world-geojson-urls', 'data'),
+                         State('countries', 'url')],
+                        prevent_initial_call=True)
+
+# Callback to show a year on the main page, runs in the browser. It selects the frame of the year of both figures,
+# and during the animation also shows the year of the bundle. Otherwise it requests the year from the server.
+app.clientside_callback(ClientsideFunction(namespace='animation', function_name='show_world_year'),
+                        Output('world-gdp-graph', 'figure', allow_duplicate=True),
+                        Output('world-affected-graph', 'figure', allow_duplicate=True),
+                        Output('events', 'data', allow_duplicate=True),
+                        Output("world-aggregated-data", "children", allow_duplicate=True),
+                        Output('countries', 'hideout', allow_duplicate=True),
+                        Output('world-year-request', 'data'),
+                        Input('world-year-slider', 'value'),
+                        [State('animation-interval', 'disabled'),
+                         State('world-animation-bundle', 'data'),
+                         State('world-gdp-graph', 'figure'),
+                         State('world-affected-graph', 'figure'),
+                         State('countries', 'hideout')],
+                        prevent_initial_call=True)
 
 # Callback to handle a value change of the slider on the main page
 @app.callback(Output('events', 'data'),
-              Output('world-gdp-graph', 'figure'),
-              Output('world-affected-graph', 'figure'),
               Output("world-aggregated-data", "children"),
               Output('countries', 'hideout'),
-              Input('world-year-slider', 'value'),
-              [State("world-affected-tabs", 'active_tab'),
-               State('world-gdp-tabs', 'active_tab'),
-               State('countries', 'hideout')])
-def worldwide_slider_change(current_year, affected_filter, gdp_filter, old_hideout):
-    return callbacks.slider_change(data.df_disasters, data.df_gdp, current_year, affected_filter, gdp_filter, old_hideout=old_hideout)
-
-# Callback to handle switching preferences for the gdp graph on the main page
-@app.callback(Output('world-gdp-graph', 'figure', allow_duplicate=True),
+              Input('world-year-request', 'data'),
+              State('countries', 'hideout'))
+def worldwide_slider_change(current_year, old_hideout):
+    return callbacks.slider_change(data.disaster_index, data.cube, current_year, old_hideout=old_hideout)
+
+# Callback to handle switching preferences for the gdp graph on the main page, also creates the initial graph
+@app.callback(Output('world-gdp-graph', 'figure'),
               Input('world-gdp-tabs', 'active_tab'),
-              State('world-year-slider', 'value'),
-              prevent_initial_call=True)
+              State('world-year-slider', 'value'))
 def worldwide_gdp_switch(active_tab, current_year):
-    return callbacks.changed_gdp_filter(data.df_gdp, current_year, None, active_tab != 'general')
+    return callbacks.changed_gdp_filter(data.cube, current_year, None, active_tab != 'general')
 
-# Callback to handle switching preferences for the affected graph on the mmain page
-@app.callback(Output('world-affected-graph', 'figure', allow_duplicate=True),
+# Callback to handle switching preferences for the affected graph on the mmain page, also creates the initial graph
+@app.callback(Output('world-affected-graph', 'figure'),
               Input('world-affected-tabs', 'active_tab'),
-              State('world-year-slider', 'value'),
-              prevent_initial_call=True)
+              State('world-year-slider', 'value'))
 def worldwide_affected_switch(active_tab, current_year):
-    return callbacks.changed_affected_filter(data.df_disasters, current_year, active_tab)
+    return callbacks.changed_affected_filter(data.cube, current_year, active_tab)
 
 # Callback to show the overlay with all the events for the world
-@app.callback(Output("world-events-accordion", "children"), 
-              Output("world-offcanvas", "is_open"), 
+@app.callback(Output("world-offcanvas", "is_open"), 
               Input("world-show-events", "n_clicks"), 
-              [State("world-offcanvas", "is_open"), 
-               State('world-year-slider', 'value')])
-def world_show_events(n_clicks, io, current_year):
+              State("world-offcanvas", "is_open"))
+def world_show_events(n_clicks, io):
     if n_clicks:
-        is_open = not io
-    else:
-        is_open = io
-    return callbacks.show_events_button_clicked(data.df_disasters, current_year), is_open
+        return not io
+    return io
+
+# Callback to show a page of the events of the world, the first page when the overlay is opened or the order changes
+@app.callback(Output("world-events-accordion", "children"), 
+              Output("world-events-accordion", "active_item"), 
+              Output("world-events-pagination", "max_value"), 
+              Output("world-events-pagination", "active_page"), 
+              Output("world-events-count", "children"), 
+              Input("world-offcanvas", "is_open"), 
+              Input("world-events-pagination", "active_page"), 
+              Input("world-events-sort", "value"), 
+              State('world-year-slider', 'value'))
+def world_events_page(is_open, page, sort, current_year):
+    if not is_open:
+        return [no_update] * 5
+    if ctx.triggered_id != "world-events-pagination":
+        page = 1
+    return callbacks.show_events_page(data.disaster_index, current_year, page, sort, "world")
+
+# Callback to show the details of an event of the world when it is expanded
+@app.callback(Output({"type": "world-event-detail", "index": ALL}, "children"), 
+              Input("world-events-accordion", "active_item"), 
+              State({"type": "world-event-detail", "index": ALL}, "id"), 
+              prevent_initial_call=True)
+def world_event_detail(active_item, detail_ids):
+    return callbacks.show_event_detail(active_item, detail_ids)
 
 # Callback to toggle the popup
 @app.callback(Output("popup", "children"), [Input('countries', 'n_clicks')], [State("countries", "click_feature"), State("world-year-slider", "value")], prevent_initial_call=True)
 def country_click(_n_clicks, feature, current_year):
     if feature is not None:
-        return components.generate_country_popup(data.df_disasters, feature, current_year)
+        return components.generate_country_popup(data.disaster_index, data.admin1_counts, feature, current_year)
 
-# Callback to animate the slider on the popup
+# Callback to animate the slider on the popup, the data of all years of the country is sent once when the animation starts
 @app.callback(Output('country-animation-interval', 'disabled'),
+              Output('country-animation-bundle', 'data'),
               Input('country-animation-button', 'n_clicks'),
-              State('country-animation-interval', 'disabled'),
-              prevent_initial_call=True)
-def animate_country_slider(n_clicks, animation_status):
-    return not animation_status
-
-# Callback to update the value of the slider on the popup
-@app.callback(Output('country-year-slider', 'value'),
-              Input('country-animation-interval', 'n_intervals'),
-              [State('country-year-slider', 'value'),
+              [State('country-animation-interval', 'disabled'),
+               State('country-animation-bundle', 'data'),
+               State('country-year-slider', 'min'),
                State('country-year-slider', 'max'),
-               State('country-year-slider', 'min')],
-               prevent_initial_call=True)
-def update_country_slider(_n_clicks, current_slider_value, max, min):
-    if (current_slider_value < max):
-        return current_slider_value + 1
-    else:
-        # or min if we want replay, maybe second button to allow for loops ?
-        return current_slider_value
+               State("countries", "click_feature")],
+              prevent_initial_call=True)
+def animate_country_slider(n_clicks, animation_status, bundle, min, max, country):
+    if animation_status and bundle is None:
+        country_code = country["properties"]["ISO_A3"]
+        bundle = callbacks.create_animation_bundle(data.disaster_index, data.cube, list(range(min, max + 1)), country_code)
+        return not animation_status, bundle
+    return not animation_status, no_update
+
+# Callback to update the value of the slider on the popup, runs in the browser
+app.clientside_callback(ClientsideFunction(namespace='animation', function_name='next_year'),
+                        Output('country-year-slider', 'value'),
+                        Input('country-animation-interval', 'n_intervals'),
+                        [State('country-year-slider', 'value'),
+                         State('country-year-slider', 'max')],
+                        prevent_initial_call=True)
+
+# Callback to show a year on the popup, runs in the browser. It selects the frame of the year of both figures,
+# and during the animation also shows the year of the bundle. Otherwise it requests the year from the server.
+app.clientside_callback(ClientsideFunction(namespace='animation', function_name='show_country_year'),
+                        Output('country-gdp-graph', 'figure', allow_duplicate=True),
+                        Output('country-affected-graph', 'figure', allow_duplicate=True),
+                        Output('country-events', 'data', allow_duplicate=True),
+                        Output("country-aggregated-data", "children", allow_duplicate=True),
+                        Output('country-year-request', 'data'),
+                        Input('country-year-slider', 'value'),
+                        [State('country-animation-interval', 'disabled'),
+                         State('country-animation-bundle', 'data'),
+                         State('country-gdp-graph', 'figure'),
+                         State('country-affected-graph', 'figure')],
+                        prevent_initial_call=True)
 
 # Callback to handle a value change of the slider on the popup
 @app.callback(Output('country-events', 'data'),
-              Output('country-gdp-graph', 'figure'),
-              Output('country-affected-graph', 'figure'),
               Output("country-aggregated-data", "children"),
-              Input('country-year-slider', 'value'),
-              [State('country-affected-tabs', 'active_tab'),
-               State("country-gdp-tabs", "active_tab"),
-               State("countries", "click_feature")])
-def country_slider_change(current_year, affected_filter, gdp_filter, country):
+              Input('country-year-request', 'data'),
+              State("countries", "click_feature"))
+def country_slider_change(current_year, country):
     country_code = country["properties"]["ISO_A3"]
-    return callbacks.slider_change(data.df_disasters, data.df_gdp, current_year, affected_filter, gdp_filter, country_code=country_code)
+    return callbacks.slider_change(data.disaster_index, data.cube, current_year, country_code=country_code)
 
-# Callback to handle switching preferences for the gdp graph on the popup
-@app.callback(Output('country-gdp-graph', 'figure', allow_duplicate=True),
+# Callback to handle switching preferences for the gdp graph on the popup, also creates the initial graph
+@app.callback(Output('country-gdp-graph', 'figure'),
               Input('country-gdp-tabs', 'active_tab'),
               [State('country-year-slider', 'value'),
-               State("countries", "click_feature")],
-              prevent_initial_call=True)
+               State("countries", "click_feature")])
 def country_gdp_switch(active_tab, current_year, country):
     country_code = country["properties"]["ISO_A3"]
-    return callbacks.changed_gdp_filter(data.df_gdp, current_year, country_code, active_tab != 'general')
+    return callbacks.changed_gdp_filter(data.cube, current_year, country_code, active_tab != 'general')
 
-# Callback to handle switching preferences for the affected graph on the popup
-@app.callback(Output('country-affected-graph', 'figure', allow_duplicate=True),
+# Callback to handle switching preferences for the affected graph on the popup, also creates the initial graph
+@app.callback(Output('country-affected-graph', 'figure'),
               Input('country-affected-tabs', 'active_tab'),
               [State('country-year-slider', 'value'),
-               State("countries", "click_feature")],
-              prevent_initial_call=True)
+               State("countries", "click_feature")])
 def country_affected_switch(active_tab, current_year, country):
     country_code = country["properties"]["ISO_A3"]
-    return callbacks.changed_affected_filter(data.df_disasters, current_year, active_tab, country_code)
+    return callbacks.changed_affected_filter(data.cube, current_year, active_tab, country_code)
 
 # Callback to show the overlay with all the events for a specific country
-@app.callback(Output("country-events-accordion", "children"), 
-              Output("country-offcanvas", "is_open"), 
+@app.callback(Output("country-offcanvas", "is_open"), 
               Input("country-show-events", "n_clicks"), 
-              [State("country-offcanvas", "is_open"), 
-               State("country-year-slider", "value"), 
-               State("countries", "click_feature")])
-def country_show_events(n_clicks, io, current_year, country):
+              State("country-offcanvas", "is_open"))
+def country_show_events(n_clicks, io):
     if n_clicks:
-        is_open = not io
-    else:
-        is_open = io
+        return not io
+    return io
+
+# Callback to show a page of the events of a specific country, the first page when the overlay is opened or the order changes
+@app.callback(Output("country-events-accordion", "children"), 
+              Output("country-events-accordion", "active_item"), 
+              Output("country-events-pagination", "max_value"), 
+              Output("country-events-pagination", "active_page"), 
+              Output("country-events-count", "children"), 
+              Input("country-offcanvas", "is_open"), 
+              Input("country-events-pagination", "active_page"), 
+              Input("country-events-sort", "value"), 
+              [State("country-year-slider", "value"), 
+               State("countries", "click_feature")])
+def country_events_page(is_open, page, sort, current_year, country):
+    if not is_open:
+        return [no_update] * 5
+    if ctx.triggered_id != "country-events-pagination":
+        page = 1
     country_code = country["properties"]["ISO_A3"]
-    return callbacks.show_events_button_clicked(data.df_disasters, current_year, country_code), is_open
-
-@app.callback(Output('usa-states-1', 'hideout'),
-              Input('usa-states-1', 'click_feature'), 
-              State('usa-states-1', 'hideout'), prevent_initial_call=True)
-def update_aggregated_data_on_state_click(clicked_state,  hideout):
-    global current_state
-    if (clicked_state):
-        state_name = clicked_state['properties']['ISO_1']
-        hideout['active_state'] = state_name
-        current_state = state_name
-    return hideout
-
-@app.callback([Output('us-cost-distribution-subgroups', 'children', allow_duplicate=True),
+    return callbacks.show_events_page(data.disaster_index, current_year, page, sort, "country", country_code)
+
+# Callback to show the details of an event of a specific country when it is expanded
+@app.callback(Output({"type": "country-event-detail", "index": ALL}, "children"), 
+              Input("country-events-accordion", "active_item"), 
+              State({"type": "country-event-detail", "index": ALL}, "id"), 
+              prevent_initial_call=True)
+def country_event_detail(active_item, detail_ids):
+    return callbacks.show_event_detail(active_item, detail_ids)
+
+# The selected state is kept in the browser session, so every worker can handle the clicks of every user
+@app.callback([Output('us-cost-distribution-subgroups', 'children'),
                Output('us-cost-distribution-subgroups-header', 'children'),
                Output('us-cost-distribution-mitigations', 'children'), 
                Output('us-cost-distribution-mitigations-header', 'children'), 
                Output('usa-states-1', 'click_feature'), 
-               Output('usa-states-1', 'hideout', allow_duplicate=True)], 
+               Output('usa-states-1', 'hideout'),
+               Output('us-selected-state', 'data')], 
                Input('usa-states-1', 'n_clicks'), 
                State('usa-states-1', 'click_feature'), 
-               State('usa-states-1', 'hideout'),prevent_initial_call='initial_duplicate')
-def update_usa_states_aggregated_data_on_click(_n_clicks,state_info,hideout):
-    global current_state
-    current_feature = state_info
-    if (state_info):
-        state_name = state_info['properties']['NAME_1']
-    else:
-        state_name = None
-    if state_info and current_state == state_info['properties']['ISO_1']:
-        current_state = None
-        state_name = None
-        current_feature = None
-        hideout['active_state'] = ''
+               State('usa-states-1', 'hideout'),
+               State('us-selected-state', 'data'))
+def update_usa_states_aggregated_data_on_click(_n_clicks, state_info, hideout, selected_state):
+    state_name, current_feature, selected_state = callbacks.select_state(state_info, selected_state)
+    hideout['active_state'] = selected_state or ''
+
+    disaster_bar_plot, fema_bar_plot, dis_header, fema_header = callbacks.create_cost_distributions_for_state(state_name, data.cost_distributions)
+    return disaster_bar_plot, dis_header, fema_bar_plot, fema_header, current_feature, hideout, selected_state
+
+# The hover panels are rendered in the browser, only hovers that are not in the tables are requested from the server
+app.clientside_callback(
+    ClientsideFunction(namespace='hover', function_name='state_info'),
+    Output("info", "children"), Output("info-request", "data"),
+    Input("usa-states-1", "hover_feature"), State("info-table", "data")
+)
 
-    disaster_bar_plot, fema_bar_plot, dis_header, fema_header = callbacks.create_cost_distributions_for_state(state_name,data.df_properties,data.df_disasters)
-    return disaster_bar_plot, dis_header, fema_bar_plot, fema_header, current_feature, hideout
+app.clientside_callback(
+    ClientsideFunction(namespace='hover', function_name='state_info'),
+    Output("damages_info", "children"), Output("damages-info-request", "data"),
+    Input("usa-states-2", "hover_feature"), State("damages-info-table", "data")
+)
 
-@app.callback(Output("info", "children"), [Input("usa-states-1", "hover_feature")])
-def info_hover(feature):
-    return callbacks.state_hover(feature, data.df_properties)
+app.clientside_callback(
+    ClientsideFunction(namespace='hover', function_name='country_info'),
+    Output("info_countries", "children"), Output("country-info-request", "data"),
+    Input("countries", "hover_feature"), State('world-year-slider', 'value'), State("countries", "hideout"), State("country-info-table", "data")
+)
 
-@app.callback(Output("damages_info", "children"), [Input("usa-states-2", "hover_feature")])
+@app.callback(Output("info", "children", allow_duplicate=True), Input("info-request", "data"), prevent_initial_call=True)
 def info_hover(feature):
-    return callbacks.state_hover_damages(feature, data.df_disasters)
+    return callbacks.state_hover(feature, data.state_spent_texts)
 
-@app.callback(Output("info_countries", "children", allow_duplicate=True), [Input("countries", "hover_feature")], State('world-year-slider', 'value'))
+@app.callback(Output("damages_info", "children", allow_duplicate=True), Input("damages-info-request", "data"), prevent_initial_call=True)
+def info_hover_damages(feature):
+    return callbacks.state_hover_damages(feature, data.state_damages_texts)
+
+@app.callback(Output("info_countries", "children", allow_duplicate=True), Input("country-info-request", "data"), State('world-year-slider', 'value'), prevent_initial_call=True)
 def info_map(feature, current_year):
-    return callbacks.country_hover(feature, current_year, data.df_gdp)
+    return callbacks.country_hover(feature, current_year, data.country_ratios)
 
 @app.callback(Output("log", "children"), [Input("map", "bounds")])
 def log(bounds):
     return json.dumps(bounds)
 
+if os.environ.get("PRELOAD_DATASETS"):
+    # Under gunicorn with preload_app (see gunicorn.conf.py) this runs once in the master. Everything is built before
+    # the workers are forked, so they share it instead of each building a copy. The objects are moved out of
+    # the reach of the garbage collector, so it does not write to (and copy) their pages in the workers.
+    data.load_all()
+    gc.freeze()
+else:
+    # Load the datasets in the background, the home tab is served as soon as its own data is available
+    data.warm_up()
+
 if __name__ == "__main__":
     app.run_server(debug=False)
\ No newline at end of file
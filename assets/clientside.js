@@ -0,0 +1,134 @@
+// Clientside callbacks for the sliders. The figures have a frame for every year, the slider selects one of them.
+// During the animation the markers and aggregated data come from the bundle sent by the server when the
+// animation is started, so the animation does not need a request per year.
+
+function show_frame(figure, year) {
+    // Same as components.show_year: the traces of the figure are replaced by those of the frame of the year
+    const frame = figure && figure.frames ? figure.frames.find(frame => frame.name == String(year)) : undefined
+    if (frame === undefined) {
+        return window.dash_clientside.no_update
+    }
+    const data = figure.data.map((trace, i) => Object.assign({}, trace, frame.data[i]))
+    return Object.assign({}, figure, {data: data})
+}
+
+function create_table(rows) {
+    // Same table as components.generate_aggregated_data_table
+    const cell = text => ({namespace: "dash_html_components", type: "Td", props: {children: text}})
+    const table_rows = rows.map(([label, value]) => ({
+        namespace: "dash_html_components", type: "Tr", props: {children: [cell(label), cell(value)]}
+    }))
+    return {
+        namespace: "dash_bootstrap_components", type: "Table",
+        props: {bordered: true, children: {namespace: "dash_html_components", type: "Tbody", props: {children: table_rows}}}
+    }
+}
+
+function decode_events(events, year) {
+    // Same collection as event_index.get_events_geojson, from the rows of event_index.encode_events
+    const features = events.years[year].map(([lon, lat, dis_no, subgroup, type]) => ({
+        type: "Feature",
+        properties: {"Dis No": dis_no, "Disaster Subgroup": events.subgroups[subgroup], "tooltip": events.types[type]},
+        geometry: {type: "Point", coordinates: [lon, lat]}
+    }))
+    return {type: "FeatureCollection", features: features}
+}
+
+function get_frame(bundle, year) {
+    return [decode_events(bundle.events, year), create_table(bundle.tables[year])]
+}
+
+function is_animating(animation_disabled, bundle, year) {
+    return !animation_disabled && bundle && bundle.events.years[year] !== undefined
+}
+
+function format_float(value) {
+    // Same text as repr(float(value)) in Python, used by hover_data.get_country_text
+    if (Number.isInteger(value) && Math.abs(value) < 1e16) {
+        return value.toFixed(1)
+    }
+    const [digits, exponent] = value.toExponential().split("e")
+    const power = Number(exponent)
+    if (power < -4 || power >= 16) {
+        const sign = power < 0 ? "-" : "+"
+        return digits + "e" + sign + String(Math.abs(power)).padStart(2, "0")
+    }
+    return String(value)
+}
+
+function component(type, children) {
+    return {namespace: "dash_html_components", type: type, props: {children: children}}
+}
+
+function show_info(table, name, text) {
+    // Same panel as components.generate_state_info and components.generate_country_info
+    return [...table.header, component("B", name), component("Br", null), text]
+}
+
+function hover_request(feature) {
+    // Only the properties are sent to the server, the panel does not need the geometry
+    return {properties: feature.properties}
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    animation: {
+        next_year: function(n_intervals, current_year, max) {
+            return current_year < max ? current_year + 1 : window.dash_clientside.no_update
+        },
+        show_world_year: function(year, animation_disabled, bundle, gdp_figure, affected_figure, hideout) {
+            const no_update = window.dash_clientside.no_update
+            const figures = [show_frame(gdp_figure, year), show_frame(affected_figure, year)]
+            if (!is_animating(animation_disabled, bundle, year)) {
+                return [...figures, no_update, no_update, no_update, year]
+            }
+            return [...figures, ...get_frame(bundle, year), Object.assign({}, hideout, {current_year: year}), no_update]
+        },
+        show_country_year: function(year, animation_disabled, bundle, gdp_figure, affected_figure) {
+            const no_update = window.dash_clientside.no_update
+            const figures = [show_frame(gdp_figure, year), show_frame(affected_figure, year)]
+            if (!is_animating(animation_disabled, bundle, year)) {
+                return [...figures, no_update, no_update, year]
+            }
+            return [...figures, ...get_frame(bundle, year), no_update]
+        }
+    },
+    hover: {
+        state_info: function(feature, table) {
+            const no_update = window.dash_clientside.no_update
+            if (!table || !table.texts) {
+                return [no_update, feature ? hover_request(feature) : null]
+            }
+            if (!feature) {
+                return [[...table.header, ...table.placeholder], no_update]
+            }
+            // Same default as hover_data.get_state_text
+            const name = feature.properties.NAME_1
+            const text = table.texts[name] !== undefined ? table.texts[name] : "0.000%"
+            return [show_info(table, name, text), no_update]
+        },
+        country_info: function(feature, year, hideout, table) {
+            const no_update = window.dash_clientside.no_update
+            if (!table || !hideout || !hideout.ratio_map) {
+                return [no_update, feature ? hover_request(feature) : null]
+            }
+            if (!feature) {
+                return [[...table.header, ...table.placeholder], no_update]
+            }
+            // Same as hover_data.get_country_text, countries and years without a share show 0
+            const iso = feature.properties.ISO_A3
+            const ratios = hideout.ratio_map.ratios[year]
+            const idx = hideout.ratio_map.isos.indexOf(iso)
+            const text = ratios === undefined || idx < 0 ? "0" : format_float(ratios[idx])
+            return [show_info(table, iso, text), no_update]
+        }
+    },
+    boundaries: {
+        // Same level as boundaries.get_level, the coarsest level of detail that shows all detail visible at the zoom level
+        world_url: function(zoom, urls, current_url) {
+            const levels = Object.keys(urls).map(Number).sort((a, b) => a - b)
+            const level = levels.find(level => level >= zoom)
+            const url = urls[level === undefined ? levels[levels.length - 1] : level]
+            return url === current_url ? window.dash_clientside.no_update : url
+        }
+    }
+});
@@ -1,3 +1,6 @@
+// Position of every country code in a ratio_map, built once per ratio_map instead of searching the codes for every country
+const ratio_positions = new WeakMap();
+
 window.dashExtensions = Object.assign({}, window.dashExtensions, {
     default: {
         draw_marker: function(feature, latlng) {
@@ -35,8 +38,13 @@ window.dashExtensions = Object.assign({}, window.dashExtensions, {
         draw_countries: function(feature,context){
             const {classes, colorscale, style,current_year, ratio_map} = context.props.hideout;  // get props from hideout
             let country = feature['properties']['ISO_A3'];
-            const year_data = ratio_map[current_year]
-            let value = year_data[country]  // get value the determines the color
+            // ratio_map contains the country codes once and a list of values per year, in the same order
+            const year_data = ratio_map.ratios[current_year]
+            if (!ratio_positions.has(ratio_map)) {
+                ratio_positions.set(ratio_map, new Map(ratio_map.isos.map((iso, i) => [iso, i])))
+            }
+            const index = ratio_positions.get(ratio_map).get(country)
+            let value = (year_data === undefined || index === undefined) ? undefined : year_data[index]  // get value the determines the color
             if (value === undefined) {
                 value = 0
             }
@@ -47,6 +55,17 @@ window.dashExtensions = Object.assign({}, window.dashExtensions, {
             }
             return style;
             },
+        draw_regions: function(feature, context){
+            const {classes, colorscale, style, counts} = context.props.hideout;  // get props from hideout
+            // Regions without events are not in counts
+            const value = counts[feature['properties']['GID_1']] || 0
+            for (let i = 0; i < classes.length; ++i) {
+                if (value >= classes[i]) {
+                    style.fillColor = colorscale[i];  // set the fill color according to the class
+                }
+            }
+            return style;
+        },
             
         }
 
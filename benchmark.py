@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+import plotly
+
+# The datasets are built before the app is imported instead of in a background thread, so they are not measured
+os.environ.setdefault("PRELOAD_DATASETS", "1")
+
+import app
+import data
+import util
+import callbacks
+import choropleth
+import figure_cache
+import home_layout
+
+REPORT_PATH = './benchmark_report.json'
+
+YEARS = list(range(1960, 2024))
+# The country callbacks run for every country, so only for a few years by default
+COUNTRY_YEARS = [1960, 1990, 2005, 2023]
+
+GDP_TABS = ["general", "specific"]
+AFFECTED_TABS = ["deaths", "injuries", "homeless"]
+
+# Settings of a report that have to be the same in the baseline, otherwise the latencies can not be compared
+COMPARED_SETTINGS = ["figure_cache", "dataset_version"]
+
+# Metrics that are compared with the baseline, a higher value is worse for all of them
+COMPARED_METRICS = ["p50_ms", "p90_ms", "p99_ms", "peak_memory_kb", "response_kb_mean"]
+# Latencies of fast callbacks vary by more than the threshold between runs, so a latency also has to grow by this much
+MIN_LATENCY_INCREASE_MS = 1.0
+
+def unwrap(callback):
+    # Dash wraps the callbacks of app.py, the original function can be called directly
+    return getattr(callback, '__wrapped__', callback)
+
+def get_scenarios(years, country_years, isos):
+    # The callbacks with realistic inputs: every call is a tuple of arguments, each with its own copy of the
+    # mutable arguments, so no call sees the changes of another
+    # The countries as the map sends them when one is clicked, from the borders the map starts with (the level of detail
+    # of its zoom level, or the source file when the levels of detail have not been built)
+    world = util.get_world_geojson(home_layout.WORLD_START_ZOOM)
+    countries = [feature for feature in world["features"] if isos is None or feature["properties"]["ISO_A3"] in isos]
+    states = data.usa_states_data["features"]
+    ratio_map = choropleth.encode_ratio_map(data.country_ratios)
+    events = data.disaster_index
+    event_ids = events["df"][events["df"]["Start Year"].isin(country_years)]["Dis No"].tolist()
+
+    return {
+        "worldwide_slider_change": (unwrap(app.worldwide_slider_change),
+                                    [(year, {"current_year": years[0], "ratio_map": ratio_map}) for year in years]),
+        "worldwide_gdp_switch": (unwrap(app.worldwide_gdp_switch), [(tab, year) for tab in GDP_TABS for year in years]),
+        "worldwide_affected_switch": (unwrap(app.worldwide_affected_switch), [(tab, year) for tab in AFFECTED_TABS for year in years]),
+        "animate_slider": (unwrap(app.animate_slider), [(1, True, None, years[0], years[-1])]),
+        # The page callbacks read the triggering input from the callback context, so the function behind them is called
+        "world_events_page": (callbacks.show_events_page, [(events, year, 1, "date", "world") for year in years]),
+        "world_event_detail": (unwrap(app.world_event_detail),
+                               [(event_id, [{"type": "world-event-detail", "index": event_id}]) for event_id in event_ids]),
+        "country_click": (unwrap(app.country_click), [(1, country, year) for country in countries for year in country_years]),
+        "country_slider_change": (unwrap(app.country_slider_change), [(year, country) for country in countries for year in country_years]),
+        "country_gdp_switch": (unwrap(app.country_gdp_switch),
+                               [(tab, country_years[0], country) for country in countries for tab in GDP_TABS]),
+        "country_affected_switch": (unwrap(app.country_affected_switch),
+                                    [(tab, country_years[0], country) for country in countries for tab in AFFECTED_TABS]),
+        "animate_country_slider": (unwrap(app.animate_country_slider),
+                                   [(1, True, None, years[0], years[-1], country) for country in countries]),
+        "country_events_page": (callbacks.show_events_page,
+                                [(events, year, 1, "date", "country", country["properties"]["ISO_A3"]) for country in countries for year in country_years]),
+        "info_map": (unwrap(app.info_map), [(country, year) for country in countries for year in country_years]),
+        "info_hover": (unwrap(app.info_hover), [(state,) for state in states]),
+        "info_hover_damages": (unwrap(app.info_hover_damages), [(state,) for state in states]),
+        "update_usa_states_aggregated_data_on_click": (unwrap(app.update_usa_states_aggregated_data_on_click),
+                                                       [(1, state, {"active_state": ""}, None) for state in states] +
+                                                       [(2, state, {"active_state": state["properties"]["ISO_1"]}, state["properties"]["ISO_1"]) for state in states])
+    }
+
+def get_response_size(result):
+    # Size of the response as Dash serializes it
+    return len(json.dumps(result, cls=plotly.utils.PlotlyJSONEncoder))
+
+def measure(callback, calls, memory_samples):
+    # Calls that raise are counted and left out of the metrics, the first error is kept in the report
+    latencies = []
+    sizes = []
+    succeeded = []
+    errors = []
+    for args in calls:
+        start = time.perf_counter()
+        try:
+            result = callback(*args)
+        except Exception as error:
+            errors.append(f'{type(error).__name__}: {error}')
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        sizes.append(get_response_size(result))
+        succeeded.append(args)
+
+    if not succeeded:
+        return {"calls": len(calls), "errors": len(errors), "first_error": errors[0]}
+
+    # Tracing the allocations slows every call down, so the memory is measured in a separate pass over a few of the calls.
+    # The event details are cached by the app, otherwise that pass would only measure cache hits.
+    callbacks.get_event_detail.cache_clear()
+    peak = 0
+    tracemalloc.start()
+    for args in succeeded[:memory_samples]:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        callback(*args)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {
+        "calls": len(calls),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "mean_ms": round(float(np.mean(latencies)), 3),
+        "p50_ms": round(float(p50), 3),
+        "p90_ms": round(float(p90), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(np.max(latencies)), 3),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "response_kb_mean": round(float(np.mean(sizes)) / 1024, 1),
+        "response_kb_max": round(max(sizes) / 1024, 1)
+    }
+
+def run(scenarios, names, memory_samples):
+    results = {}
+    for name in names:
+        callback, calls = scenarios[name]
+        result = measure(callback, calls, memory_samples)
+        results[name] = result
+        print(f'{name}: {result["calls"]} calls, {result["errors"]} errors, p50 {result.get("p50_ms")} ms, p99 {result.get("p99_ms")} ms', flush=True)
+    return results
+
+def get_setting_differences(report, baseline):
+    return [f'{setting}: {baseline.get(setting)} in the baseline, {report.get(setting)} now'
+            for setting in COMPARED_SETTINGS if report.get(setting) != baseline.get(setting)]
+
+def compare(report, baseline, threshold):
+    # Every metric of every callback that is in both reports, and whether it got worse by more than the threshold
+    rows = []
+    for name, result in report["callbacks"].items():
+        if name not in baseline["callbacks"]:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = baseline["callbacks"][name].get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            ratio = new / old
+            regression = ratio > threshold and (not metric.endswith("_ms") or new - old > MIN_LATENCY_INCREASE_MS)
+            rows.append({"callback": name, "metric": metric, "baseline": old, "current": new, "ratio": round(ratio, 3),
+                         "regression": regression})
+        # A callback that fails more often than before is always a regression
+        old_errors, new_errors = baseline["callbacks"][name].get("errors", 0), result["errors"]
+        rows.append({"callback": name, "metric": "errors", "baseline": old_errors, "current": new_errors,
+                     "ratio": round(new_errors / old_errors, 3) if old_errors else float(new_errors > 0),
+                     "regression": new_errors > old_errors})
+    return rows
+
+def print_comparison(rows):
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f'{row["callback"]:<45} {row["metric"]:<17} {row["baseline"]:>12} {row["current"]:>12} {row["ratio"]:>7.2f}x {flag}')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the latency, peak memory and response size of the callbacks")
+    parser.add_argument("--output", default=REPORT_PATH, help=f'report file (default: {REPORT_PATH})')
+    parser.add_argument("--baseline", help="earlier report to compare with, exits with 1 if a callback got slower or bigger, "
+                                                 "or with 2 if it was measured with other settings")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio to the baseline above which a metric is a regression (default: 1.25)")
+    parser.add_argument("--callbacks", nargs="*", help="callbacks to measure (default: all)")
+    parser.add_argument("--countries", nargs="*", help="ISO codes of the countries to use (default: all)")
+    parser.add_argument("--country-years", nargs="*", type=int, default=COUNTRY_YEARS,
+                        help=f'years to use for the country callbacks (default: {" ".join(map(str, COUNTRY_YEARS))})')
+    parser.add_argument("--memory-samples", type=int, default=10, help="calls per callback of which the peak memory is measured (default: 10)")
+    parser.add_argument("--figure-cache", action="store_true",
+                        help="use the memory tier of the figure cache, empty at the start (default: build every figure)")
+    args = parser.parse_args()
+
+    # The disk tier keeps the figures of earlier runs, so it is never used. Without the flag every figure is built.
+    figure_cache.tiers[:] = figure_cache.tiers[:1] if args.figure_cache else []
+    for tier in figure_cache.tiers:
+        tier.clear()
+    # The event details are cached by the app, each run starts without them
+    callbacks.get_event_detail.cache_clear()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        differences = get_setting_differences({"figure_cache": args.figure_cache, "dataset_version": data.dataset_version}, baseline)
+        if differences:
+            print("the baseline was measured with other settings:\n" + "\n".join(differences), file=sys.stderr)
+            sys.exit(2)
+
+    scenarios = get_scenarios(YEARS, args.country_years, set(args.countries) if args.countries else None)
+    names = args.callbacks or list(scenarios)
+    for name in names:
+        if name not in scenarios:
+            parser.error(f'unknown callback: {name}')
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "dataset_version": data.dataset_version,
+        "figure_cache": args.figure_cache,
+        "callbacks": run(scenarios, names, args.memory_samples)
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'report -> {args.output}')
+
+    if baseline:
+        rows = compare(report, baseline, args.threshold)
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
@@ -0,0 +1,184 @@
+import os
+import gzip
+import json
+import math
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+import shapely
+from shapely.geometry import shape, mapping
+
+try:
+    import brotli
+except ImportError:
+    # brotli is optional, without it only gzip variants are written
+    brotli = None
+
+GEOJSON_DIRECTORY = './Data/GeoJson1'
+LOD_DIRECTORY = os.path.join(GEOJSON_DIRECTORY, 'lod')
+
+# Zoom levels for which a simplified variant is generated. The simplification tolerance of a level is the size of
+# a pixel at that zoom level, so the simplification is not visible as long as the map is not zoomed in any further.
+ZOOM_LEVELS = [2, 5, 8, 11]
+
+# Extension of the precompressed variant of every encoding, written next to every file that is served, in the
+# order geojson_server prefers them
+COMPRESSED_EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+
+def get_tolerance(zoom):
+    # Degrees per pixel of a 256 pixel web mercator tile at the equator
+    return 360 / (256 * 2 ** zoom)
+
+def get_lod_filename(name, zoom):
+    # Relative to the GeoJson directory
+    return f'lod/{name}.z{zoom}.json'
+
+def get_lod_path(name, zoom):
+    return os.path.join(GEOJSON_DIRECTORY, get_lod_filename(name, zoom))
+
+def get_source_filename(name, directory = GEOJSON_DIRECTORY):
+    # Relative to the GeoJson directory. The full GADM file is the most detailed source, the _opt variant is used
+    # when it is not available.
+    for filename in [f'{name}.json', f'{name}.json_opt.json']:
+        if os.path.exists(os.path.join(directory, filename)):
+            return filename
+    return None
+
+def get_source_path(name, directory = GEOJSON_DIRECTORY):
+    filename = get_source_filename(name, directory)
+    return os.path.join(directory, filename) if filename else None
+
+def write_compressed(path):
+    with open(path, 'rb') as file:
+        content = file.read()
+    # Without a timestamp in the header, so a rebuild of the same file writes the same bytes
+    variants = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli:
+        variants["br"] = brotli.compress(content, quality=11)
+    for encoding, variant in variants.items():
+        with open(path + COMPRESSED_EXTENSIONS[encoding], 'wb') as file:
+            file.write(variant)
+
+def get_names():
+    names = {filename.split('.json')[0] for filename in os.listdir(GEOJSON_DIRECTORY) if filename.endswith('.json')}
+    # The output of the optimizer script is not a boundary file
+    return sorted(name for name in names if not name.startswith('optimizer.sh'))
+
+def quantize(coordinates, decimals):
+    if isinstance(coordinates[0], (int, float)):
+        return [round(coordinate, decimals) for coordinate in coordinates]
+    return [quantize(part, decimals) for part in coordinates]
+
+def get_polygons(geometry):
+    # The polygons of a geometry. Some of the GADM boundaries are not valid polygons, those are repaired first, and
+    # repaired geometries can be collections that contain multipolygons and lines, so the parts are flattened twice.
+    if geometry is None:
+        return None
+    parts = shapely.get_parts(shapely.get_parts(shapely.make_valid(shape(geometry))))
+    polygons = parts[shapely.get_type_id(parts) == 3]
+    return shapely.multipolygons(polygons) if len(polygons) else None
+
+def assign_faces(faces, polygons):
+    # Index of the polygon that covers the largest part of every face, -1 for faces that are mostly outside all
+    # polygons (gaps between the original borders, lakes)
+    known = np.flatnonzero([polygon is not None for polygon in polygons])
+    tree = shapely.STRtree([polygons[idx] for idx in known])
+    face_idx, polygon_idx = tree.query(faces, predicate="intersects")
+    areas = shapely.area(shapely.intersection(faces[face_idx], tree.geometries[polygon_idx]))
+
+    owners = np.full(len(faces), -1)
+    covered = np.zeros(len(faces))
+    for face, polygon, area in zip(face_idx, polygon_idx, areas):
+        if area > covered[face]:
+            owners[face], covered[face] = known[polygon], area
+    owners[covered < shapely.area(faces) / 2] = -1
+    return owners
+
+def simplify_geometries(geometries, zoom):
+    # Simplifies the polygons of a boundary file together, so neighbours keep identical borders without gaps or
+    # slivers between them. The borders are split into arcs between the points where three or more polygons meet,
+    # every arc is simplified once (shared arcs are used by both neighbours) and the
+    # polygons are rebuilt from the simplified arcs. The tolerance is the size of a pixel at the zoom level.
+    tolerance = get_tolerance(zoom)
+    polygons = [get_polygons(geometry) for geometry in geometries]
+    if all(polygon is None for polygon in polygons):
+        return [None] * len(geometries)
+
+    arcs = shapely.line_merge(shapely.union_all([shapely.boundary(polygon) for polygon in polygons if polygon is not None]))
+    simplified = shapely.simplify(arcs, tolerance, preserve_topology=True)
+    # Simplified arcs can still cross each other where they run close together, the crossings are noded again so
+    # polygonize finds every face
+    noded = shapely.union_all(shapely.get_parts(simplified))
+    faces = shapely.get_parts(shapely.polygonize(shapely.get_parts(noded)))
+    owners = assign_faces(faces, polygons)
+
+    # Islands smaller than a pixel are not visible, but each of them still costs a ring of coordinates
+    areas = shapely.area(faces)
+    decimals = math.ceil(-math.log10(tolerance))
+    results = []
+    for idx, polygon in enumerate(polygons):
+        owned = np.flatnonzero(owners == idx)
+        if polygon is None or len(owned) == 0:
+            # Polygons that collapse into their neighbours at coarse levels keep their own simplified shape
+            results.append(None if polygon is None else mapping(shapely.simplify(polygon, tolerance, preserve_topology=True)))
+            continue
+        kept = owned[areas[owned] >= tolerance ** 2]
+        if len(kept) == 0:
+            kept = owned[[areas[owned].argmax()]]
+        # Faces of the same polygon that touch (where the original polygons overlapped) are merged again
+        geometry = shapely.union_all(faces[kept]) if len(kept) > 1 else faces[kept[0]]
+        geometry = mapping(geometry)
+        # Written with as few decimals as the tolerance allows, rounding is the same for both sides of a shared border
+        geometry["coordinates"] = quantize(geometry["coordinates"], decimals)
+        results.append(geometry)
+    return results
+
+def build_lod(name):
+    with open(get_source_path(name), encoding='utf-8') as file:
+        geojson = json.load(file)
+
+    os.makedirs(LOD_DIRECTORY, exist_ok=True)
+    for zoom in ZOOM_LEVELS:
+        geometries = simplify_geometries([feature["geometry"] for feature in geojson["features"]], zoom)
+        features = [{"type": "Feature", "properties": feature["properties"], "geometry": geometry}
+                    for feature, geometry in zip(geojson["features"], geometries)]
+        with open(get_lod_path(name, zoom), 'w', encoding='utf-8') as file:
+            json.dump({"type": "FeatureCollection", "features": features}, file, separators=(',', ':'))
+
+    # The files the app can link to are compressed here, the server only sends them: the levels of detail, the _opt
+    # file that the country popups use without them, and the source file of the world borders (see util)
+    served = [get_lod_path(name, zoom) for zoom in ZOOM_LEVELS] + [os.path.join(GEOJSON_DIRECTORY, f'{name}.json_opt.json')]
+    if name == 'countries':
+        served.append(get_source_path(name))
+    for path in dict.fromkeys(served):
+        if os.path.exists(path):
+            write_compressed(path)
+    return name
+
+def get_level(zoom):
+    # The coarsest level that still shows all detail visible at the given zoom level
+    for level in ZOOM_LEVELS:
+        if level >= zoom:
+            return level
+    return ZOOM_LEVELS[-1]
+
+def get_lod_file(name, zoom):
+    # Returns the file of the simplified variant for the zoom level, or None if it has not been generated
+    level = get_level(zoom)
+    return get_lod_filename(name, level) if os.path.exists(get_lod_path(name, level)) else None
+
+def get_zoom_for_bounds(bounds, size = 800):
+    # Zoom level at which the bounds ([min_lon, min_lat, max_lon, max_lat]) fit in a map of `size` pixels
+    min_lon, min_lat, max_lon, max_lat = bounds
+    extent = max(max_lon - min_lon, max_lat - min_lat, 1e-6)
+    return max(0, math.floor(math.log2(360 * size / (256 * extent))))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate simplified and compressed boundary files for every zoom level")
+    parser.add_argument("names", nargs="*", help="files to simplify, e.g. BEL or countries (default: all)")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+    with Pool(args.processes) as pool:
+        for name in pool.imap_unordered(build_lod, args.names or get_names()):
+            print(f'simplified and compressed {name}')
@@ -1,23 +1,51 @@
+import functools
+import pandas as pd
+from dash import no_update
+import aggregates
 import components
+import data
+import event_index
+import figure_cache
 import us_layout
 import util
 import locale
 
 locale.setlocale(locale.LC_ALL, '')
 
+AFFECTED_METRICS = ["Total Deaths", "No Injured", "No Homeless"]
+
+# Years of the sliders, the gdp and affected figures have a frame for each of them
+YEARS = list(range(1960, 2024))
+
+# Number of events of which the details are kept
+EVENT_DETAIL_CACHE_SIZE = 4096
+
 def update_map_on_slider_increment(clicked_state,data):
     colour_map = us_layout.generate_states_colours(data)
     return {'active_state': clicked_state, 'colour_map': colour_map}
 
 
-def create_cost_distributions_for_state(state,df_properties,df_disasters):
-    disaster_cost_distribution, fema_cost_distribution = util.get_disaster_and_fema_cost_distribution_per_state(state,df_properties,df_disasters)
-    fema_disaster_map = {key: value[1] for key,value in fema_cost_distribution.items()}
-    fema_cost_distribution = {key: value[0] for key,value in fema_cost_distribution.items()}
-    disaster_map = {key:key for key,_ in disaster_cost_distribution.items()}
+def select_state(clicked_feature, selected_state):
+    # Clicking the selected state again deselects it, returns the name and feature of the state to show and its code
+    if not clicked_feature or clicked_feature['properties']['ISO_1'] == selected_state:
+        return None, None, None
+    return clicked_feature['properties']['NAME_1'], clicked_feature, clicked_feature['properties']['ISO_1']
+
+def create_cost_distributions_for_state(state, distributions):
+    # The distributions of every state are computed once, the bar plots are built once per state and cached
+    disaster_cost_distribution, fema_cost_distribution = util.get_disaster_and_fema_cost_distribution_per_state(state, distributions)
+
+    def build_disaster_figure():
+        disaster_map = {key:key for key,_ in disaster_cost_distribution.items()}
+        return components.generate_cost_bar_figure(disaster_cost_distribution, disaster_map)
 
-    disaster_bar_plot = components.generate_cost_bar_plots(disaster_cost_distribution, disaster_map)
-    fema_bar_plot = components.generate_cost_bar_plots(fema_cost_distribution, fema_disaster_map)
+    def build_fema_figure():
+        fema_disaster_map = {key: value[1] for key,value in fema_cost_distribution.items()}
+        return components.generate_cost_bar_figure({key: value[0] for key,value in fema_cost_distribution.items()}, fema_disaster_map)
+
+    version = data.fema_version
+    disaster_bar_plot = components.generate_cost_graph(figure_cache.get_figure("cost-disasters", build_disaster_figure, state or "U.S.", "all", version))
+    fema_bar_plot = components.generate_cost_graph(figure_cache.get_figure("cost-mitigations", build_fema_figure, state or "U.S.", "all", version))
     if state:
         dis_header = f"Damage distribution over disaster subgroups {state}"
         fema_header = f"Mitigation cost distribution {state}."
@@ -26,76 +54,83 @@ def create_cost_distributions_for_state(state,df_properties,df_disasters):
         fema_header = "Mitigation cost distribution U.S."
     return disaster_bar_plot, fema_bar_plot, dis_header, fema_header
 
-def changed_affected_filter(events, current_year, current_filter, country_code = None):
-    # If a country code is given filter events using the code
-    if country_code:
-        events = util.filter_events(events, {'ISO': country_code})
-
-    # Filter events to go up until current year
-    events = events[events["Start Year"] <= current_year]
-
-    # Generate the updated graph
-    return components.generate_affected_graph(events, current_year, current_filter)
-
-def changed_gdp_filter(gdp_data, current_year, country_code = None, specific = False):
-    # If a country code is given filter events using the code
+def changed_affected_filter(cube, current_year, current_filter, country_code = None):
+    # Get the yearly totals per disaster subgroup of the country, or the world if no country code is given
+    # and generate the graph with a frame for every year, unless it is already cached
+    def build():
+        affected_data = aggregates.get_subgroup_series(cube, AFFECTED_METRICS, YEARS[-1], country_code)
+        return components.generate_affected_graph(affected_data, current_filter, YEARS)
+
+    figure = figure_cache.get_figure("affected", build, country_code, current_filter)
+    return components.show_year(figure, current_year)
+
+def changed_gdp_filter(cube, current_year, country_code = None, specific = False):
+    # Get the yearly gdp share per disaster subgroup of the country, or the world if no country code is given
+    # and generate the graph with a frame for every year, unless it is already cached
+    def build():
+        gdp_data = get_gdp_data(cube, YEARS[-1], country_code)
+        return components.generate_gdp_graph(gdp_data, YEARS, specific)
+
+    figure = figure_cache.get_figure("gdp", build, country_code, "specific" if specific else "general")
+    return components.show_year(figure, current_year)
+
+def get_gdp_data(cube, current_year, country_code = None):
+    if not aggregates.has_gdp_data(cube, country_code):
+        # Typed columns, so the share is kept when the subgroups are summed and the graph is empty
+        return pd.DataFrame({"Start Year": pd.Series(dtype=int), "Disaster Subgroup": pd.Series(dtype=object),
+                             "share": pd.Series(dtype=float)})
+    return aggregates.get_subgroup_series(cube, ["share"], current_year, country_code)
+
+def show_events_page(events, current_year, page, sort, prefix, country_code = None):
+    # Filter the events by the current year, and the country code if one is given, and show a page of them
+    filters = {"Start Year": current_year}
     if country_code:
-        gdp_data = util.filter_events(gdp_data, {'ISO': country_code})
-    else:
-        gdp_data = gdp_data.groupby(["Start Year", "Disaster Subgroup", "Disaster Type"], as_index=False).sum(numeric_only=True)
-
-    # Generate the updated graph
-    return components.generate_gdp_graph(gdp_data, current_year, specific)
-
-def show_events_button_clicked(events, current_year, country_code = None):
-    # If a country code is given filter events using the code
-    if country_code:
-        events = util.filter_events(events, {'ISO': country_code})
-
-    # Filter the events by the current year
-    events = util.filter_events(events, {"Start Year": current_year})
+        filters["ISO"] = country_code
+    page_events, total, page = event_index.get_events_page(events, filters, sort, page, components.EVENTS_PAGE_SIZE)
+    pages = event_index.get_page_count(total, components.EVENTS_PAGE_SIZE)
 
-    # Return the updated component
-    return components.create_events_accordion(events)
+    # Return the updated components, with all events collapsed
+    return components.create_events_accordion(page_events, prefix), None, pages, page, components.create_events_count(total)
 
-def slider_change(events, gdp_data, current_year, affected_filter, gdp_filter, country_code = None,old_hideout = None):
-    # If a country code is given filter events using the code
-    if country_code:
-        events = util.filter_events(events, {'ISO': country_code})
-        gdp_data = util.filter_events(gdp_data, {'ISO': country_code})
-    else:
-        gdp_data = gdp_data.groupby(["Start Year", "Disaster Subgroup"], as_index=False).sum(numeric_only=True)
-
-    # Filter the events that contain location data for the map
-    map_data = util.filter_events(events, {"Start Year": current_year}, True)
+@functools.lru_cache(maxsize=EVENT_DETAIL_CACHE_SIZE)
+def get_event_detail(event_id):
+    # The details of an event never change, so they are built once per event
+    event, _ = event_index.get_event(data.disaster_index, event_id)
+    return components.create_event_detail(event)
 
-    # Filter the events by year
-    yearly_data = util.filter_events(events, {"Start Year": current_year})
+def show_event_detail(active_item, detail_ids):
+    # Only the expanded event gets its details, the others keep what they show
+    return [get_event_detail(active_item) if detail_id["index"] == active_item else no_update for detail_id in detail_ids]
 
-    # Convert events to geojson for the map
-    events_geojson = util.convert_events_to_geojson(map_data)
+def slider_change(events, cube, current_year, country_code = None, old_hideout = None):
+    # The figures are not updated here, the slider selects their frame of the year in the browser
 
-    # Generate the gdp figure
-    gdp_fig = components.generate_gdp_graph(gdp_data, current_year, gdp_filter != "general")
-
-    # Generate the affected figure
-    affected_fig = components.generate_affected_graph(events, current_year, affected_filter)
+    # Get the geojson of the events of the current year that contain location data for the map
+    events_geojson = event_index.get_events_geojson(events, current_year, country_code)
 
     # Generate the aggregated data component
-    aggregated_data = components.generate_aggregated_data_table(yearly_data)
+    aggregated_data = components.generate_aggregated_data_table(aggregates.get_yearly_totals(cube, current_year, country_code))
 
     # update hideout for the world map
     if (old_hideout != None):
         old_hideout['current_year'] = current_year
-        return events_geojson, gdp_fig, affected_fig, aggregated_data, old_hideout
+        return events_geojson, aggregated_data, old_hideout
+
+    return events_geojson, aggregated_data
 
-    return events_geojson, gdp_fig, affected_fig, aggregated_data
+def create_animation_bundle(events, cube, years, country_code = None):
+    # The markers and aggregated data of every year, so the animation can step through the years in the browser.
+    # The figures are not part of it, they already contain a frame for every year.
+    return {
+        "events": event_index.encode_events({year: event_index.get_events_geojson(events, year, country_code) for year in years}),
+        "tables": {year: components.get_aggregated_data_rows(aggregates.get_yearly_totals(cube, year, country_code)) for year in years}
+    }
 
-def state_hover(feature, df):
-    return components.generate_state_info(df, feature)
+def state_hover(feature, texts):
+    return components.generate_state_info(texts, feature)
 
-def state_hover_damages(feature, df):
-    return components.generate_state_damages_info(df, feature)
+def state_hover_damages(feature, texts):
+    return components.generate_state_damages_info(texts, feature)
 
-def country_hover(feature, current_year, df):
-    return components.generate_country_info(df, current_year, feature)
+def country_hover(feature, current_year, ratio_matrix):
+    return components.generate_country_info(ratio_matrix, current_year, feature)
@@ -0,0 +1,16 @@
+def build_ratio_matrix(df_gdp):
+    # Year x ISO matrix with the share of the gdp lost to disasters, built in a single pivot
+    return df_gdp.pivot_table(index="Start Year", columns="ISO", values="share", aggfunc="sum", fill_value=0)
+
+def get_year_ratios(matrix, year):
+    # Share per country for a single year
+    if year not in matrix.index:
+        return {}
+    return matrix.loc[year].to_dict()
+
+def encode_ratio_map(matrix):
+    # Compact encoding for the front-end: the country codes once, and a list of shares (in the same order) per year
+    return {
+        "isos": matrix.columns.tolist(),
+        "ratios": {int(year): matrix.loc[year].tolist() for year in matrix.index}
+    }
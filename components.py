@@ -1,14 +1,22 @@
+import numpy as np
 import pandas as pd
+import shapely
+import shapely.geometry
 import plotly.express as px
 import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
 import dash_leaflet as dl
+import dash_leaflet.express as dlx
 
 from dash_iconify import DashIconify
 from dash import html, dcc
 from dash_extensions.javascript import arrow_function, Namespace
 
 import util
+import boundaries
+import aggregates
+import event_index
+import hover_data
 
 ns = Namespace("dashExtensions", "default")
 
@@ -27,7 +35,7 @@ DISASTER_SUBGROUPS = [
     "Meteorological"
 ]
 
-def generate_cost_bar_plots(data,colour_map=None,log=False):
+def generate_cost_bar_figure(data,colour_map=None,log=False):
     data = {key:value for key,value in data.items() if value > 0}
     labels = list(data.keys())
     values = list(data.values())
@@ -41,21 +49,19 @@ def generate_cost_bar_plots(data,colour_map=None,log=False):
     figure.add_trace(go.Bar(x=labels, y=values,
                     marker=dict(color = list(map(get_colour, list(colour_map.keys()))))))
     figure.update_layout(hovermode="x unified")
+    return figure
+
+def generate_cost_graph(figure):
     return dcc.Graph(figure=figure, style={"height": "80%"})
 
-def generate_aggregated_data_table(df):
-    # Fill missing values with 0s
-    df = df.fillna(0)
+def generate_cost_bar_plots(data,colour_map=None,log=False):
+    return generate_cost_graph(generate_cost_bar_figure(data, colour_map, log))
+
+def get_aggregated_data_rows(totals):
+    # If there was no data, just show 0s
+    if not totals["count"]:
+        totals = dict.fromkeys(totals, 0)
 
-    # Aggregate data and keep relevant columns
-    yearly_data = df.groupby("Start Year").sum(numeric_only=True)[
-        ["Total Deaths", "No Injured", "No Affected", "No Homeless", "Reconstruction Costs, Adjusted ('000 US$)", "Insured Damages, Adjusted ('000 US$)", "Total Damages, Adjusted ('000 US$)"]]
-    
-    # If there was no data, just construct a dataframe containing 0s
-    if df.empty:
-        yearly_data = pd.DataFrame({"Total Deaths": [0], "No Injured": [0], "No Affected": [0], "No Homeless": [
-                                   0], "Total Damages, Adjusted ('000 US$)": [0], "Reconstruction Costs, Adjusted ('000 US$)": [0], "Insured Damages, Adjusted ('000 US$)": [0]})
-        
     # Mapping between dataframe column names and names used in the front-end
     column_mapping = {
         "Total Deaths": "Deaths",
@@ -67,52 +73,40 @@ def generate_aggregated_data_table(df):
         "Insured Damages, Adjusted ('000 US$)": "Insured ('000 US$)"
     }
 
-    # Construct table
-    table_rows = []
+    # Label and formatted value of every row, the animation builds the table from these in the browser
+    rows = []
     for column in column_mapping:
         if column in ["Total Deaths", "No Injured", "No Affected", "No Homeless"]:
-            table_rows.append(html.Tr([html.Td(column_mapping[column]), html.Td(util.format_large_number(yearly_data[column].values[0], False))]))
+            rows.append([column_mapping[column], util.format_large_number(totals[column], False)])
         else:
-            table_rows.append(html.Tr([html.Td(column_mapping[column]), html.Td(util.format_large_number(yearly_data[column].values[0]))]))
+            rows.append([column_mapping[column], util.format_large_number(totals[column])])
+    return rows
 
+def generate_aggregated_data_table(totals):
+    # Construct table
+    table_rows = [html.Tr([html.Td(label), html.Td(value)]) for label, value in get_aggregated_data_rows(totals)]
     return dbc.Table(html.Tbody(table_rows), bordered=True)
 
 
-def generate_affected_graph(df, current_year, current_toggle):
-    # Filter dataframe and only keep relevant columns
-    affected_data = df[df["Start Year"] <= current_year][["Start Year", "Disaster Subgroup",
-                        "Total Deaths", "No Injured", "No Homeless"]]
-
-    # Fill missing data with 0s
-    missing_rows = {"Start Year": [], "Disaster Subgroup": [],
-                    "Total Deaths": [], "No Injured": [], "No Homeless": []}
-    
-    for year in range(1960, current_year+1):
-        if year not in affected_data["Start Year"].values:
-            for dis_group in DISASTER_SUBGROUPS:
-                missing_rows["Start Year"].append(year)
-                missing_rows["Disaster Subgroup"].append(dis_group)
-                missing_rows["Total Deaths"].append(None)
-                missing_rows["No Injured"].append(None)
-                missing_rows["No Homeless"].append(None)
-        else:
-            for dis_group in DISASTER_SUBGROUPS:
-                if dis_group not in affected_data[affected_data["Start Year"] == year]["Disaster Subgroup"].values:
-                    missing_rows["Start Year"].append(year)
-                    missing_rows["Disaster Subgroup"].append(dis_group)
-                    missing_rows["Total Deaths"].append(None)
-                    missing_rows["No Injured"].append(None)
-                    missing_rows["No Homeless"].append(None)
-
-    # Add augmented rows to original data
-    if len(missing_rows["Start Year"]) != 0:
-        affected_data = pd.concat([pd.DataFrame(missing_rows), affected_data.loc[:]]).reset_index(drop=True)
+def add_year_frames(fig, years):
+    # One frame per year with the traces cut off at that year, the slider selects a frame instead of rebuilding the figure.
+    # The x values are sorted, so the number of points of every trace shown in a year is found for all years at once.
+    traces = [(np.asarray(trace.x), np.asarray(trace.y)) for trace in fig.data]
+    counts = [np.searchsorted(x, years, side="right") for x, _ in traces]
+    fig.frames = [go.Frame(name=str(year), data=[go.Scatter(x=x[:count[idx]], y=y[:count[idx]]) for (x, y), count in zip(traces, counts)])
+                  for idx, year in enumerate(years)]
+    return fig
 
-    # Replace Nan by 0s
-    affected_data = affected_data.fillna(0)
+def show_year(figure, year):
+    # Returns the figure (as json) with the traces of the frame of the year
+    frame = next((frame for frame in figure.get("frames", []) if frame["name"] == str(year)), None)
+    if frame is None:
+        return figure
+    # Frames of a figure without traces have no data
+    return {**figure, "data": [{**trace, **frame_trace} for trace, frame_trace in zip(figure["data"], frame.get("data", []))]}
 
-    # Aggregate data
-    affected_data = affected_data.groupby(["Start Year", "Disaster Subgroup"], as_index=False).sum(numeric_only=True)
+def generate_affected_graph(affected_data, current_toggle, years):
+    # The data already contains a row for every year and disaster subgroup, so there are no gaps to fill
 
     # Map toggle value to dataframe column
     column_map = {
@@ -128,11 +122,9 @@ def generate_affected_graph(df, current_year, current_toggle):
     fig.update_traces(mode="markers+lines", hovertemplate=None)
     fig.update_layout(hovermode="x unified", xaxis_title="Year", xaxis=dict(
         tickformat="d"), margin=dict(l=0, r=0, t=0, b=0))
-    return fig
+    return add_year_frames(fig, years)
 
-def generate_gdp_graph(gdp_data, current_year, categories = False):
-    gdp_data = gdp_data[gdp_data["Start Year"] <= current_year]
-    
+def generate_gdp_graph(gdp_data, years, categories = False):
     if categories:
         gdp_data = gdp_data.groupby(["Start Year", "Disaster Subgroup"], as_index=False).sum(numeric_only=True)
         gdp_fig = px.line(gdp_data, 'Start Year', 'share', color="Disaster Subgroup", color_discrete_map=EVENT_COLOURS)
@@ -143,22 +135,51 @@ def generate_gdp_graph(gdp_data, current_year, categories = False):
     gdp_fig.update_traces(mode="markers+lines", hovertemplate=None)
     gdp_fig.update_layout(hovermode="x unified", xaxis_title="Year", yaxis_title="% of GDP in damages", xaxis=dict(
         tickformat="d"), margin=dict(l=0, r=0, t=0, b=0))
-    return gdp_fig
+    return add_year_frames(gdp_fig, years)
+
+# Number of events on a page of the event list
+EVENTS_PAGE_SIZE = 20
 
-def create_events_accordion(events):
-    # Create accordion for all events
+EVENT_SORT_OPTIONS = [
+    {"label": "Date", "value": "date"},
+    {"label": "Total deaths", "value": "deaths"},
+    {"label": "Total damages", "value": "damages"}
+]
+
+def create_events_list(prefix):
+    # Sorting, a page of events and the pagination, the page is filled by a callback when the list is opened
+    return [
+        dbc.Select(id=f"{prefix}-events-sort", options=EVENT_SORT_OPTIONS, value="date", size="sm"),
+        html.P(id=f"{prefix}-events-count", className="mt-2 mb-2"),
+        dbc.Accordion(id=f"{prefix}-events-accordion", start_collapsed=True),
+        dbc.Pagination(id=f"{prefix}-events-pagination", max_value=1, active_page=1, fully_expanded=False,
+                       first_last=True, previous_next=True, size="sm", className="mt-2")
+    ]
+
+def create_events_count(total):
+    return f"{total} events" if total != 1 else "1 event"
+
+def create_events_accordion(events, prefix):
+    # Only the titles of the events on the page, the details of an event are added when it is expanded
     accordion = []
     for _, event in events.iterrows():
-        accordion.append(create_event_accordion_item(event))
+        accordion.append(create_event_accordion_item(event, prefix))
     return accordion
 
-def create_event_accordion_item(event):
+def get_event_title(event):
     # If the disaster has a name use it, else use the date
     if not pd.isnull(event["Event Name"]):
-        title = event["Event Name"]
-    else:
-        title = f"{event['Disaster Type']}, {util.get_date(event)}"
+        return event["Event Name"]
+    return f"{event['Disaster Type']}, {util.get_date(event)}"
+
+def create_event_accordion_item(event, prefix):
+    return dbc.AccordionItem(
+        title=get_event_title(event),
+        item_id=event["Dis No"],
+        children=html.Div(id={"type": f"{prefix}-event-detail", "index": event["Dis No"]})
+    )
 
+def create_event_detail(event):
     # If location data is known use it, else unknown
     if (not pd.isnull(event["Latitude"])) and (not pd.isnull(event["Longitude"])):
         location = f"{event['Latitude']}, {event['Longitude']}"
@@ -226,60 +247,40 @@ def create_event_accordion_item(event):
     else:
         classification = f"{event['Disaster Subgroup']}/{event['Disaster Type']}"
 
+    details = [
+        html.P([html.B("Event classification: "), classification]),
+        html.P([html.B("Event date: "), util.get_date(event)]),
+        html.P([html.B("Local time: "), local_time]),
+        html.P([html.B("Region: "), region])
+    ]
     if river_basin:
-        # Create accordion for event
-        accordion = dbc.AccordionItem(
-            title=title,
-            children=[
-                html.P([html.B("Event classification: "), classification]),
-                html.P([html.B("Event date: "), util.get_date(event)]),
-                html.P([html.B("Local time: "), local_time]),
-                html.P([html.B("Region: "), region]),
-                html.P([html.B("River origin: "), river_basin]),
-                html.P([html.B("Lat, Long: "), location]),
-                html.P([html.B("Impact: "), impact]),
-                html.P([html.B("No. affected: "), affected]),
-                html.P([html.B("Total deaths: "), deaths]),
-                html.P([html.B("No. injured: "), injured]),
-                html.P([html.B("No. homeless: "), homeless]),
-                html.P([html.B("Total damages ('000 US$): "), damages]),
-                html.P([html.B("Reconstruction costs ('000 US$): "), reconstruction]),
-                html.P([html.B("Insured damages ('000 US$): "), insured]),
-            ]
-        )
-    else:
-        accordion = dbc.AccordionItem(
-            title=title,
-            children=[
-                html.P([html.B("Event classification: "), classification]),
-                html.P([html.B("Event date: "), util.get_date(event)]),
-                html.P([html.B("Local time: "), local_time]),
-                html.P([html.B("Region: "), region]),
-                html.P([html.B("Lat, Long: "), location]),
-                html.P([html.B("Impact: "), impact]),
-                html.P([html.B("No. affected: "), affected]),
-                html.P([html.B("Total deaths: "), deaths]),
-                html.P([html.B("No. injured: "), injured]),
-                html.P([html.B("No. homeless: "), homeless]),
-                html.P([html.B("Total damages ('000 US$): "), damages]),
-                html.P([html.B("Reconstruction costs ('000 US$): "), reconstruction]),
-                html.P([html.B("Insured damages ('000 US$): "), insured]),
-            ]
-        )
-
-    return accordion
-
-def generate_country_popup(disaster_data, country, current_year):
+        details.append(html.P([html.B("River origin: "), river_basin]))
+    return details + [
+        html.P([html.B("Lat, Long: "), location]),
+        html.P([html.B("Impact: "), impact]),
+        html.P([html.B("No. affected: "), affected]),
+        html.P([html.B("Total deaths: "), deaths]),
+        html.P([html.B("No. injured: "), injured]),
+        html.P([html.B("No. homeless: "), homeless]),
+        html.P([html.B("Total damages ('000 US$): "), damages]),
+        html.P([html.B("Reconstruction costs ('000 US$): "), reconstruction]),
+        html.P([html.B("Insured damages ('000 US$): "), insured]),
+    ]
+
+# Classes and colours of the admin-1 regions on the country popup, by their number of events since 1960
+REGION_CLASSES = [0, 1, 2, 5, 10, 20, 50]
+REGION_COLORSCALE = ['#ffffff', '#ffffb2', '#fed976', '#feb24c', '#fd8d3c', '#f03b20', '#bd0026']
+REGION_STYLE = dict(weight=2, opacity=1, color='#123456', dashArray='', fillOpacity=0.5)
+
+def generate_country_popup(disaster_data, admin1_counts, country, current_year):
     # Fetch meta data about the country
     country_name = country["properties"]["ADMIN"]
     country_iso = country["properties"]["ISO_A3"]
 
-    # Filter the events by country code and start year
-    country_data = util.filter_events(
-        disaster_data, {"ISO": country_iso, "Start Year": current_year})
-    
-    # Filter map events to the events that contain location data
-    map_data = util.filter_events(country_data, {}, True)
+    # The map zooms to the bounds of the country, so only the level of detail of that zoom level is needed
+    zoom = None
+    if country.get("geometry"):
+        zoom = boundaries.get_zoom_for_bounds(shapely.bounds(shapely.geometry.shape(country["geometry"])))
 
     country_slider = dcc.Slider(min=1960,
                                 max=2023,
@@ -345,12 +346,18 @@ def generate_country_popup(disaster_data, country, current_year):
     animation_interval = dcc.Interval(
         'country-animation-interval', interval=500, disabled=True)
 
+    # The data of every year for the animation, loaded when it is started, and the year that has to be loaded from the server
+    animation_bundle = dcc.Store(id='country-animation-bundle')
+    year_request = dcc.Store(id='country-year-request', data=current_year)
+
     country_slider_wrapper = dbc.Row(
         children=[
             dbc.Col(
                 children=[
                     animation_button,
-                    animation_interval
+                    animation_interval,
+                    animation_bundle,
+                    year_request
                 ],
                 className="column",
                 width="auto"),
@@ -370,16 +377,20 @@ def generate_country_popup(disaster_data, country, current_year):
         children=[
             dl.TileLayer(),
             # https://datahub.io/core/geo-countries#resource-countries
+            # The admin-1 regions, coloured by their number of events
             dl.GeoJSON(
-                data=util.get_country_data(country_iso),
+                url=util.get_country_data_url(country_iso, zoom),
                 id="country",
-                # Invisible polygons,
-                options={"style": {"color": "#123456", "weight": "2"}},
+                options=dict(style=ns("draw_regions")),
+                hideout=dict(colorscale=REGION_COLORSCALE, classes=REGION_CLASSES, style=REGION_STYLE,
+                             counts=aggregates.get_admin1_counts(admin1_counts, country_iso)),
                 zoomToBounds=True,
                 hoverStyle=arrow_function(dict(weight=3, color='#666', dashArray=''))),  # Gray border on hover (line_thickness, color, line_style)
-            dl.GeoJSON(data=util.convert_events_to_geojson(map_data),  # Only show events of country
+            dl.GeoJSON(data=event_index.get_events_geojson(disaster_data, current_year, country_iso),  # Only show events of country
                        id="country-events",
                        options=dict(pointToLayer=ns("draw_marker"))),
+            dlx.categorical_colorbar(categories=[f'{cls}+' for cls in REGION_CLASSES], colorscale=REGION_COLORSCALE,
+                                     width=200, height=20, position="bottomleft"),
             map_legend,
             country_slider_wrapper
         ],
@@ -520,11 +531,7 @@ def generate_country_popup(disaster_data, country, current_year):
             html.Div(
                 children=[
                     dbc.Offcanvas(
-                        children=[
-                            dbc.Accordion(
-                                id="country-events-accordion"
-                            )
-                        ],
+                        children=create_events_list("country"),
                         is_open=False,
                         placement="end",
                         id="country-offcanvas"
@@ -544,40 +551,46 @@ def create_tab_with_fig(fig,category):
         dcc.Graph(figure=fig)
     ], label=category)
 
-def generate_state_info(df, feature = None):
-    header = [html.H4("% of money spent on mitigation in comparison with entire U.S.")]
+def get_state_info_header():
+    return [html.H4("% of money spent on mitigation in comparison with entire U.S.")]
+
+def get_state_damages_info_header():
+    return [html.H4("% of damages collected in comparison with the entire U.S")]
+
+def get_country_info_header():
+    return [html.H6("% of GDP in damages", style={'margin':0}), html.Br(), html.H6("because of Natural disasters", style={'margin':0})]
+
+def get_state_info_table(texts):
+    return hover_data.create_hover_table(get_state_info_header(), [html.P("Hover over a state")], texts)
+
+def get_state_damages_info_table(texts):
+    return hover_data.create_hover_table(get_state_damages_info_header(), [html.P("Hover over a state")], texts)
+
+def get_country_info_table():
+    return hover_data.create_hover_table(get_country_info_header(), [html.P("Hover over a country")])
+
+# The hover panels are rendered in the browser from the tables above, these are used when a text is missing there
+
+def generate_state_info(texts, feature = None):
+    header = get_state_info_header()
     if not feature:
         return header + [html.P("Hover over a state")]
-    else:
-        state_name = feature["properties"]["NAME_1"]
-        total_spent = util.get_total_spent(df)
-        state_spent = util.get_state_spending(state_name, df)["total"]
-    return header + [html.B(state_name), html.Br(),
-                     "{:.3f}%".format((state_spent / total_spent) * 100)]
-
-def generate_state_damages_info(df, feature = None):
-    header = [html.H4("% of damages collected in comparison with the entire U.S")]
+    state_name = feature["properties"]["NAME_1"]
+    return header + [html.B(state_name), html.Br(), hover_data.get_state_text(texts, state_name)]
+
+def generate_state_damages_info(texts, feature = None):
+    header = get_state_damages_info_header()
     if not feature:
         return header + [html.P("Hover over a state")]
-    else:
-        state_name = feature["properties"]["NAME_1"]
-        total_spent = util.get_total_damages(df)
-        state_spent = util.get_total_damages_state(df,state_name)
-    return header + [html.B(state_name), html.Br(),
-                     "{:.3f}%".format((state_spent / total_spent) * 100)]
-
-def generate_country_info(df, current_year, feature=None):
-    header = [html.H6("% of GDP in damages", style={'margin':0}), html.Br(), html.H6("because of Natural disasters", style={'margin':0})]
+    state_name = feature["properties"]["NAME_1"]
+    return header + [html.B(state_name), html.Br(), hover_data.get_state_text(texts, state_name)]
+
+def generate_country_info(ratio_matrix, current_year, feature=None):
+    header = get_country_info_header()
     if not feature:
         return header + [html.P("Hover over a country")]
-    else:
-        df = df[df['Start Year'] == current_year].groupby('ISO').sum(numeric_only=True)
-        country_name = feature['properties']['ISO_A3']
-        if (country_name in df.index):
-            value = df.loc[country_name, "share"]
-        else:
-            value = 0
-        return header + [html.B(country_name), html.Br(), format(value)]
+    country_name = feature['properties']['ISO_A3']
+    return header + [html.B(country_name), html.Br(), hover_data.get_country_text(ratio_matrix, current_year, country_name)]
     
 def generate_average_death_comparison_bar_plot(df_disasters):
     before_fema, after_fema = util.compare_deaths_before_and_after_fema(df_disasters)
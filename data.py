@@ -1,6 +1,108 @@
-import pandas as pd
+import threading
+import time
 
-df_disasters = pd.read_csv("Data/Preprocessed-Natural-Disasters.csv", delimiter=";")
-df_gdp = pd.read_csv('./Data/gdp_data2.csv')
-df_properties = pd.read_json('./Data/preprocessed-fema-properties.json')
-df_projects = pd.read_json('./Data/preprocessed-fema-projects.json')
\ No newline at end of file
+import aggregates
+import choropleth
+import datasets
+import event_index
+import fema_aggregates
+
+# Registry of datasets and values derived from them. Nothing is loaded at import: every entry is built the
+# first time it is accessed (as `data.<name>`), after its dependencies, or by the background warm-up.
+registry = {}
+values = {}
+load_timings = {}
+
+def register(name, dependencies = ()):
+    def decorator(build):
+        registry[name] = {"build": build, "dependencies": list(dependencies), "lock": threading.Lock()}
+        return build
+    return decorator
+
+def get(name):
+    if name not in values:
+        entry = registry[name]
+        # Only one thread builds an entry, the others wait for its result
+        with entry["lock"]:
+            if name not in values:
+                dependencies = [get(dependency) for dependency in entry["dependencies"]]
+                start = time.perf_counter()
+                values[name] = entry["build"](*dependencies)
+                load_timings[name] = time.perf_counter() - start
+    return values[name]
+
+def is_loaded(name):
+    return name in values
+
+def load_all(names = None):
+    # Load the entries in order of registration
+    for name in (list(registry) if names is None else names):
+        get(name)
+
+def warm_up(names = None):
+    # Load the entries in a background thread, so requests can be served meanwhile
+    thread = threading.Thread(target=load_all, args=(names,), name="data-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def __getattr__(name):
+    if name in registry:
+        return get(name)
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+@register("df_disasters")
+def load_disasters():
+    return datasets.load("disasters")
+
+@register("df_gdp")
+def load_gdp():
+    return datasets.load("gdp")
+
+# Year x ISO x disaster type totals, used by the callbacks instead of filtering the dataframes
+@register("cube", ["df_disasters", "df_gdp"])
+def build_cube(df_disasters, df_gdp):
+    return aggregates.build_cube(df_disasters, df_gdp)
+
+# Grouped and hashed lookups of the events, used instead of boolean masks over the whole dataframe
+@register("disaster_index", ["df_disasters"])
+def build_disaster_index(df_disasters):
+    return event_index.build_index(df_disasters)
+
+# Events per admin-1 region of every country, used to colour the regions on the country popup
+@register("admin1_counts", ["df_disasters"])
+def build_admin1_counts(df_disasters):
+    return aggregates.build_admin1_counts(df_disasters)
+
+# Year x ISO share of the gdp lost to disasters, used to colour the world map
+@register("country_ratios", ["df_gdp"])
+def build_country_ratios(df_gdp):
+    return choropleth.build_ratio_matrix(df_gdp)
+
+# Version of the loaded datasets, part of the key of every cached figure
+@register("dataset_version", ["df_disasters", "df_gdp"])
+def get_dataset_version(df_disasters, df_gdp):
+    return datasets.get_version(["disasters", "gdp"])
+
+# The FEMA datasets are only needed for the U.S. tab, so they are registered last
+@register("df_properties")
+def load_properties():
+    return datasets.load("properties")
+
+@register("df_projects")
+def load_projects():
+    return datasets.load("projects")
+
+# State x fiscal year x program x property action totals of the FEMA properties, and the U.S. damages per state
+@register("fema_cube", ["df_properties", "df_disasters"])
+def build_fema_cube(df_properties, df_disasters):
+    return fema_aggregates.build_fema_cube(df_properties, df_disasters)
+
+# Damage per disaster subgroup and mitigation cost per property action of every state, looked up when a state is clicked
+@register("cost_distributions", ["df_properties", "df_disasters"])
+def build_cost_distributions(df_properties, df_disasters):
+    return fema_aggregates.build_cost_distributions(df_properties, df_disasters)
+
+# Version of the datasets of the U.S. tab, part of the key of its cached figures
+@register("fema_version", ["df_properties", "df_disasters"])
+def get_fema_version(df_properties, df_disasters):
+    return datasets.get_version(["properties", "disasters"])
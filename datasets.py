@@ -0,0 +1,97 @@
+import os
+import hashlib
+import argparse
+import pandas as pd
+import pyarrow.feather as feather
+
+# Directory with the typed, columnar (Arrow IPC) copies of the datasets
+COLUMNAR_DIRECTORY = './Data/columnar'
+
+def read_disasters(path):
+    df = pd.read_csv(path, delimiter=";")
+    # The CPI column uses a comma as decimal separator
+    df["CPI"] = pd.to_numeric(df["CPI"].str.replace(",", "."))
+    return df
+
+# Source file, parser and categorical columns of every dataset
+DATASETS = {
+    "disasters": {
+        "source": "./Data/Preprocessed-Natural-Disasters.csv",
+        "read": read_disasters,
+        # GID_1 is the admin-1 region of the event, filled by geocoding.py
+        "categories": ["Disaster Subgroup", "Disaster Type", "ISO", "GID_1"]
+    },
+    "gdp": {
+        "source": "./Data/gdp_data2.csv",
+        "read": pd.read_csv,
+        "categories": ["Disaster Subgroup", "Disaster Type", "ISO"]
+    },
+    "properties": {
+        "source": "./Data/preprocessed-fema-properties.json",
+        "read": pd.read_json,
+        "categories": ["state"]
+    },
+    "projects": {
+        "source": "./Data/preprocessed-fema-projects.json",
+        "read": pd.read_json,
+        "categories": ["state"]
+    }
+}
+
+def get_columnar_path(name):
+    return os.path.join(COLUMNAR_DIRECTORY, f'{name}.arrow')
+
+def apply_schema(df, categories):
+    for column in categories:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+
+    # Integers are downcast to the smallest type that fits. Floats are kept as they are, since a smaller
+    # float type would change the sums that are shown in the dashboard.
+    for column in df.select_dtypes(include="integer").columns:
+        df[column] = pd.to_numeric(df[column], downcast="integer")
+    return df
+
+def build(name):
+    dataset = DATASETS[name]
+    df = apply_schema(dataset["read"](dataset["source"]), dataset["categories"])
+
+    os.makedirs(COLUMNAR_DIRECTORY, exist_ok=True)
+    # Uncompressed, so the file can be memory-mapped when it is loaded
+    feather.write_feather(df, get_columnar_path(name), compression="uncompressed")
+    return df
+
+def is_up_to_date(name):
+    # Without its text source the columnar copy is used as it is
+    path = get_columnar_path(name)
+    source = DATASETS[name]["source"]
+    if not os.path.exists(source):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'{name}: neither the source {source} nor the columnar copy {path} exists')
+        return True
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source)
+
+def load(name):
+    # Parsing the text sources is slow, so they are only parsed when the columnar copy is missing or outdated
+    if not is_up_to_date(name):
+        build(name)
+    # Columns without missing values are not copied out of the memory-mapped file, so the processes
+    # that load the same file share its pages
+    return feather.read_table(get_columnar_path(name), memory_map=True).to_pandas(split_blocks=True)
+
+def get_version(names):
+    # Changes whenever one of the columnar files is rebuilt, used to invalidate values cached across restarts
+    paths = [get_columnar_path(name) for name in names]
+    stamps = [f'{path}:{os.path.getmtime(path)}:{os.path.getsize(path)}' for path in paths if os.path.exists(path)]
+    return hashlib.sha1(';'.join(stamps).encode()).hexdigest()[:12]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the datasets into typed columnar files")
+    parser.add_argument("names", nargs="*", help=f'datasets to convert, one of {", ".join(DATASETS)} (default: all)')
+    names = parser.parse_args().names or list(DATASETS)
+    for name in names:
+        if name not in DATASETS:
+            parser.error(f'unknown dataset: {name}')
+    for name in names:
+        df = build(name)
+        print(f'{name}: {len(df)} rows -> {get_columnar_path(name)}')
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# Columns (and combinations of them) the events are grouped on
+INDEXED_COLUMNS = ["ISO", "Start Year"]
+
+def build_index(df):
+    df = df.reset_index(drop=True)
+    return {
+        "df": df,
+        # Hash index from the event id to its row
+        "ids": dict(zip(df["Dis No"], range(len(df)))),
+        # Row positions of every group, in the original order of the dataframe
+        "groups": {
+            ("ISO",): df.groupby("ISO", observed=True).indices,
+            ("Start Year",): df.groupby("Start Year").indices,
+            ("ISO", "Start Year"): df.groupby(["ISO", "Start Year"], observed=True).indices
+        },
+        "has_location": (df["Latitude"].notnull() & df["Longitude"].notnull()).to_numpy(),
+        # Marker feature collections per (year, ISO), filled on first use
+        "geojson": {}
+    }
+
+def get_positions(index, filters):
+    # Look up the rows of the most specific group that matches the filters
+    columns = tuple(column for column in INDEXED_COLUMNS if column in filters)
+    if not columns:
+        return np.arange(len(index["df"])), columns
+    key = tuple(filters[column] for column in columns)
+    if len(key) == 1:
+        key = key[0]
+    return index["groups"][columns].get(key, np.array([], dtype=int)), columns
+
+def filter_events(index, filters, location_important = False):
+    positions, indexed = get_positions(index, filters)
+    if location_important:
+        positions = positions[index["has_location"][positions]]
+    data = index["df"].iloc[positions]
+
+    # Filters on columns without an index are applied to the (small) result
+    for filter in filters:
+        if filter not in indexed:
+            data = data[data[filter] == filters[filter]]
+    return data
+
+# Orders the event list can be sorted in, the columns and whether they are ascending
+EVENT_SORTS = {
+    "date": (["Start Year", "Start Month", "Start Day"], True),
+    "deaths": (["Total Deaths"], False),
+    "damages": (["Total Damages, Adjusted ('000 US$)"], False)
+}
+
+def get_page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+def get_events_page(index, filters, sort, page, page_size):
+    # A page of the sorted events that match the filters, the number of events that match and the page number,
+    # which is moved to the last page if there are less pages
+    events = filter_events(index, filters)
+    page = min(max(page or 1, 1), get_page_count(len(events), page_size))
+    columns, ascending = EVENT_SORTS.get(sort, EVENT_SORTS["date"])
+    # Events without a value are put last, events with the same value keep their original order
+    events = events.sort_values(columns, ascending=ascending, kind="stable", na_position="last")
+    start = (page - 1) * page_size
+    return events.iloc[start:start + page_size], len(events), page
+
+def get_event(index, event_id):
+    event = index["df"].iloc[index["ids"][event_id]]
+    lat = event['Latitude']
+    long = event['Longitude']
+    if (pd.isna(lat) or pd.isna(long)):
+        return event, None
+    else:
+        return event, [lat, long]
+
+def to_geojson(df):
+    # Build the marker features in one pass over the columns instead of row by row
+    columns = zip(df["Dis No"].tolist(), df["Disaster Subgroup"].tolist(), df["Disaster Type"].tolist(),
+                  df["Longitude"].tolist(), df["Latitude"].tolist())
+    features = [{"type": "Feature",
+                 "properties": {"Dis No": dis_no, "Disaster Subgroup": subgroup, "tooltip": tooltip},
+                 "geometry": {"type": "Point", "coordinates": [lon, lat]}}
+                for dis_no, subgroup, tooltip, lon, lat in columns]
+    return {"type": "FeatureCollection", "features": features}
+
+def get_events_geojson(index, current_year, country_code = None):
+    # The world map and the country popup both ask for the same years, so every collection is only built once
+    key = (current_year, country_code)
+    if key not in index["geojson"]:
+        filters = {"Start Year": current_year}
+        if country_code:
+            filters["ISO"] = country_code
+        index["geojson"][key] = to_geojson(filter_events(index, filters, True))
+    return index["geojson"][key]
+
+def encode_events(geojson_by_year):
+    # Compact form of the marker collections of several years: one row per event, with the subgroups and types
+    # (which repeat a lot) replaced by their position in a list that is only sent once
+    subgroups, types = {}, {}
+    years = {}
+    for year, geojson in geojson_by_year.items():
+        years[year] = [[*feature["geometry"]["coordinates"],
+                        feature["properties"]["Dis No"],
+                        subgroups.setdefault(feature["properties"]["Disaster Subgroup"], len(subgroups)),
+                        types.setdefault(feature["properties"]["tooltip"], len(types))]
+                       for feature in geojson["features"]]
+    return {"subgroups": list(subgroups), "types": list(types), "years": years}
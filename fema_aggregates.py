@@ -0,0 +1,95 @@
+import pandas as pd
+
+from converter import fema_action_to_disaster
+
+# Mitigation programs that are shown per state
+PROGRAMS = ['FMA', 'HMGP', 'LPDM', 'PDM', 'RFC', 'SRL']
+
+KEYS = ["state", "programFy", "programArea", "propertyAction"]
+DAMAGES = "Total Damages, Adjusted ('000 US$)"
+
+def build_fema_cube(df_properties, df_disasters):
+    # The FEMA properties are summed once per state, fiscal year, program and property action,
+    # the U.S. disasters once per state, year and disaster subgroup. Missing keys are kept as their own group.
+    spending = df_properties.groupby(KEYS, observed=True, dropna=False)["actualAmountPaid"].sum()
+
+    us_disasters = df_disasters[(df_disasters['ISO'] == 'USA') & (df_disasters['us state'].notna())]
+    damages = us_disasters.groupby(["us state", "Start Year", "Disaster Subgroup"], observed=True, dropna=False)[DAMAGES].sum()
+
+    return {
+        "spending": spending,
+        "damages": damages,
+        # Totals that are asked for on every hover
+        "state_programs": spending.groupby(level=["state", "programArea"], observed=True, dropna=False).sum().unstack(fill_value=0),
+        "total_spent": spending.sum(),
+        "state_damages": damages.groupby(level="us state").sum()
+    }
+
+def get_state_spending(fema, state = None):
+    # Spending per program of the state, or of the whole U.S. if no state is given
+    state_programs = fema["state_programs"]
+    if state:
+        programs = state_programs.loc[state] if state in state_programs.index else pd.Series(dtype=float)
+    else:
+        programs = state_programs.sum()
+
+    spending = {program: programs.get(program, 0) for program in PROGRAMS}
+    spending['total'] = sum(spending.values(), 0)
+    return spending
+
+def get_states_spending(fema):
+    # Total spending on the programs of every state
+    state_programs = fema["state_programs"]
+    return state_programs[[program for program in PROGRAMS if program in state_programs.columns]].sum(axis=1)
+
+def get_total_spent(fema):
+    return fema["total_spent"]
+
+def get_total_damages(fema):
+    return fema["state_damages"].sum()
+
+def get_total_damages_state(fema, state):
+    return fema["state_damages"].get(state, 0)
+
+def get_spending_per_state(fema, year):
+    # Spending of every state in a fiscal year
+    spending = fema["spending"]
+    return spending[spending.index.get_level_values("programFy") == year].groupby(level="state", observed=True).sum()
+
+def get_damages_per_state(fema, until_year):
+    # Damages of every state up to and including a year
+    damages = fema["damages"]
+    return damages[damages.index.get_level_values("Start Year") <= until_year].groupby(level="us state").sum()
+
+def get_program_spending(fema, year, state = None):
+    # Spending per program in a fiscal year, of a state or the whole U.S., the largest first
+    spending = fema["spending"]
+    selected = spending.index.get_level_values("programFy") == year
+    if state:
+        selected &= spending.index.get_level_values("state") == state
+    return spending[selected].groupby(level="programArea").sum().sort_values(ascending=False)
+
+def get_damage_distribution(damages):
+    # Damage per disaster subgroup, only the subgroups with damages
+    return {subgroup: value for subgroup, value in damages.items() if value > 0}
+
+def get_action_distribution(costs):
+    # Cost per property action, with the disaster subgroup it mitigates, only the actions with a known subgroup
+    return {action: [value, fema_action_to_disaster[action]] for action, value in costs.items()
+            if action in fema_action_to_disaster and value > 0}
+
+def build_cost_distributions(df_properties, df_disasters):
+    # Damage per disaster subgroup and mitigation cost per property action of every state, those of all states are under None
+    damages = df_disasters.groupby(["us state", "Disaster Subgroup"], observed=True)[DAMAGES].sum()
+    costs = df_properties.groupby(["state", "propertyAction"], observed=True)["actualAmountPaid"].sum()
+
+    disasters = {state: get_damage_distribution(group.droplevel(0)) for state, group in damages.groupby(level=0, observed=True)}
+    disasters[None] = get_damage_distribution(df_disasters.groupby("Disaster Subgroup", observed=True)[DAMAGES].sum())
+    actions = {state: get_action_distribution(group.droplevel(0)) for state, group in costs.groupby(level=0, observed=True)}
+    actions[None] = get_action_distribution(df_properties.groupby("propertyAction", observed=True)["actualAmountPaid"].sum())
+    return {"disasters": disasters, "actions": actions}
+
+def get_cost_distribution(distributions, state = None):
+    # Damage and mitigation cost distribution of the state, or of all states if no state is given
+    state = state or None
+    return distributions["disasters"].get(state, {}), distributions["actions"].get(state, {})
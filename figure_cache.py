@@ -0,0 +1,48 @@
+import json
+
+from flask_caching import Cache
+
+import data
+import metrics
+
+FIGURE_CACHE_DIRECTORY = './Data/figure_cache'
+
+# The figures are fully determined by their key, which contains the dataset version, so entries never expire.
+# The memory tier holds the figures that are requested most, the disk tier keeps them across restarts and workers.
+MEMORY_CONFIG = {"CACHE_TYPE": "SimpleCache", "CACHE_THRESHOLD": 1000, "CACHE_DEFAULT_TIMEOUT": 0}
+DISK_CONFIG = {"CACHE_TYPE": "FileSystemCache", "CACHE_DIR": FIGURE_CACHE_DIRECTORY, "CACHE_THRESHOLD": 20000,
+               "CACHE_DEFAULT_TIMEOUT": 0}
+
+# Cache tiers, fastest first. Empty until init_app is called, in that case every figure is built.
+tiers = []
+stats = {"hits": 0, "misses": 0}
+
+def init_app(server):
+    tiers[:] = [Cache(server, config=MEMORY_CONFIG), Cache(server, config=DISK_CONFIG)]
+
+def get_key(name, scope, filter, version = None):
+    # The figures contain a frame for every year, so the year is not part of the key
+    return f'{name}/{version or data.dataset_version}/{scope or "world"}/{filter}'
+
+def get_figure(name, build, scope, filter, version = None):
+    # Returns the figure json for the key from the cache, or builds the figure and caches it
+    if not tiers:
+        return json.loads(build().to_json())
+
+    key = get_key(name, scope, filter, version)
+    for idx, tier in enumerate(tiers):
+        serialized = tier.get(key)
+        if serialized is not None:
+            # Figures found in a slower tier are copied into the faster ones
+            for faster in tiers[:idx]:
+                faster.set(key, serialized)
+            stats["hits"] += 1
+            metrics.figure_cache_requests.labels("hit").inc()
+            return json.loads(serialized)
+
+    stats["misses"] += 1
+    metrics.figure_cache_requests.labels("miss").inc()
+    serialized = build().to_json()
+    for tier in tiers:
+        tier.set(key, serialized)
+    return json.loads(serialized)
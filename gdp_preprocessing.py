@@ -0,0 +1,57 @@
+import time
+import argparse
+
+import pandas as pd
+
+import datasets
+
+GDP_PATH = './Data/gdp_data_constant.csv'
+DAMAGES = "Total Damages, Adjusted ('000 US$)"
+CLASSES = ['Disaster Subgroup', 'Disaster Type']
+
+# The GDP is in constant 2015 US$, it is multiplied by this factor to bring it to the price level of the adjusted damages
+PRICE_FACTOR = 1.14
+
+YEARS = list(range(1960, 2024))
+
+def load_gdp(path, years):
+    # One row per country and year instead of a column per year
+    df_gdp = pd.read_csv(path)
+    columns = [str(year) for year in years if str(year) in df_gdp.columns]
+    gdp = df_gdp.melt(id_vars=['Country Code'], value_vars=columns, var_name='Start Year', value_name='gdp')
+    gdp = gdp.rename(columns={'Country Code': 'ISO'})
+    gdp['Start Year'] = gdp['Start Year'].astype(int)
+    gdp['gdp'] = gdp['gdp'] * PRICE_FACTOR
+    return gdp
+
+def get_classes(df_disasters):
+    # Every combination of disaster subgroup and type that occurs, in the order they first occur
+    return df_disasters[CLASSES].drop_duplicates().dropna().reset_index(drop=True)
+
+def build_gdp_shares(df_gdp, df_disasters, years = YEARS):
+    # The share of the gdp that was lost to every disaster type, for every year and every country with disasters.
+    # Years without damages (or without a known gdp) have a share of 0.
+    damages = df_disasters.groupby(['Start Year', 'ISO'] + CLASSES, as_index=False, observed=True)[DAMAGES].sum()
+
+    classes = get_classes(df_disasters)
+    grid = pd.MultiIndex.from_product([df_disasters['ISO'].drop_duplicates().dropna(), years, classes.index],
+                                      names=['ISO', 'Start Year', 'class']).to_frame(index=False)
+    grid = grid.join(classes, on='class').drop(columns='class')
+
+    shares = grid.merge(damages, on=['Start Year', 'ISO'] + CLASSES, how='left').merge(df_gdp, on=['Start Year', 'ISO'], how='left')
+    shares['share'] = ((shares[DAMAGES] * 1000 / shares['gdp']) * 100).fillna(0)
+    return shares[['Start Year', 'ISO'] + CLASSES + ['share']]
+
+if __name__ == "__main__":
+    output = datasets.DATASETS["gdp"]["source"]
+    events = datasets.DATASETS["disasters"]["source"]
+    parser = argparse.ArgumentParser(description="Compute the share of the gdp lost to disasters, per country, year and disaster type")
+    parser.add_argument("--gdp", default=GDP_PATH, help=f'gdp per country and year in constant US$ (default: {GDP_PATH})')
+    parser.add_argument("--events", default=events, help=f'semicolon separated events file (default: {events})')
+    parser.add_argument("--output", default=output, help=f'output file (default: {output})')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    shares = build_gdp_shares(load_gdp(args.gdp, YEARS), datasets.read_disasters(args.events))
+    shares.to_csv(args.output, index=False)
+    print(f'{len(shares)} rows -> {args.output} in {time.perf_counter() - start:.2f}s')
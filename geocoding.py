@@ -0,0 +1,124 @@
+import json
+import time
+import argparse
+import functools
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+
+import boundaries
+from converter import abbrev_to_us_state
+
+EVENTS_PATH = './Data/Preprocessed-Natural-Disasters.csv'
+
+# Column with the GADM admin-1 id of the region of every event, the same id as in the boundary files the region map colours.
+# ISO_1 is missing in the boundary files of most countries, GID_1 is in all of them.
+ADMIN1_COLUMN = 'GID_1'
+
+# Events just off the coast are assigned to the nearest region within this distance (in degrees, about 10 km)
+COAST_DISTANCE = 0.1
+
+@functools.lru_cache(maxsize=None)
+def load_regions(path):
+    # The admin-1 polygons of a boundary file in a spatial index, with their names and codes in the same order
+    with open(path, encoding='utf-8') as file:
+        features = json.load(file)["features"]
+    return {
+        "tree": shapely.STRtree([shape(feature["geometry"]) for feature in features]),
+        "names": np.array([feature["properties"].get("NAME_1") for feature in features], dtype=object),
+        "isos": np.array([feature["properties"].get("ISO_1") for feature in features], dtype=object),
+        "gids": np.array([feature["properties"].get("GID_1") for feature in features], dtype=object)
+    }
+
+def locate(latitudes, longitudes, path, max_distance = 0):
+    # Position of the region that contains every point, -1 for points outside all regions or without coordinates.
+    # With a max_distance, points outside all regions get the nearest region within that distance.
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    located = np.full(len(latitudes), -1)
+
+    tree = load_regions(path)["tree"]
+    known = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+    points = shapely.points(longitudes[known], latitudes[known])
+    inside, regions = tree.query(points, predicate="intersects")
+    # A point on a shared border is in both regions, the first one is used
+    inside, first = np.unique(inside, return_index=True)
+    located[known[inside]] = regions[first]
+
+    outside = np.setdiff1d(np.arange(len(known)), inside)
+    if max_distance and len(outside):
+        nearest, regions = tree.query_nearest(points[outside], max_distance=max_distance, all_matches=False)
+        located[known[outside[nearest]]] = regions
+    return located
+
+def locate_regions(latitudes, longitudes, path):
+    # NAME_1 and ISO_1 of the region that contains every point, None outside all regions
+    regions = load_regions(path)
+    located = locate(latitudes, longitudes, path)
+    found = located >= 0
+    names = np.full(len(located), None, dtype=object)
+    isos = np.full(len(located), None, dtype=object)
+    names[found] = regions["names"][located[found]]
+    isos[found] = regions["isos"][located[found]]
+    return pd.DataFrame({"NAME_1": names, "ISO_1": isos}, index=latitudes.index if isinstance(latitudes, pd.Series) else None)
+
+def get_us_state_name(iso, name):
+    # The boundary file writes the names without spaces, the datasets use the full name of the state
+    return abbrev_to_us_state.get(iso.split('-')[-1], name)
+
+def locate_us_states(latitudes, longitudes, path = None, directory = boundaries.GEOJSON_DIRECTORY):
+    # Name of the U.S. state of every point, None outside the U.S. Without a path the USA file of the GeoJson
+    # directory is used, the directory is only needed when running from another working directory.
+    regions = locate_regions(latitudes, longitudes, path or boundaries.get_source_path('USA', directory))
+    return pd.Series([get_us_state_name(iso, name) if iso else None for iso, name in zip(regions["ISO_1"], regions["NAME_1"])],
+                     index=regions.index, dtype=object)
+
+def lat_long_to_state(lat, long):
+    return locate_us_states([lat], [long]).iloc[0]
+
+def locate_admin1(task):
+    # GID_1 of the region of every event of a country, None if there is no boundary file for the country
+    iso, latitudes, longitudes = task
+    path = boundaries.get_source_path(iso)
+    if path is None or iso == 'countries':
+        return [None] * len(latitudes)
+    located = locate(latitudes, longitudes, path, COAST_DISTANCE)
+    gids = load_regions(path)["gids"]
+    return [gids[position] if position >= 0 else None for position in located]
+
+def join_admin1(df, processes = None):
+    # The events are joined per country, with the regions of the boundary file of their ISO code, instead of with one
+    # index of all regions. Every process only loads the boundary files of the countries it is given, but an event
+    # whose coordinates are not within COAST_DISTANCE of its EM-DAT country gets no region.
+    latitudes = pd.to_numeric(df["Latitude"])
+    longitudes = pd.to_numeric(df["Longitude"])
+    geolocated = df[latitudes.notna() & longitudes.notna()]
+    groups = [(iso, group.index) for iso, group in geolocated.groupby("ISO", observed=True)]
+    tasks = [(iso, latitudes[index].to_numpy(), longitudes[index].to_numpy()) for iso, index in groups]
+
+    with Pool(processes) as pool:
+        results = pool.map(locate_admin1, tasks)
+
+    column = pd.Series(None, index=df.index, dtype=object)
+    for (_, index), gids in zip(groups, results):
+        column[index] = gids
+    return column
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the us state and admin-1 region columns of the events from their coordinates, offline")
+    parser.add_argument("--events", default=EVENTS_PATH, help=f'semicolon separated events file (default: {EVENTS_PATH})')
+    parser.add_argument("--boundaries", help="boundary file with the U.S. states (default: the USA file in the GeoJson directory)")
+    parser.add_argument("--processes", type=int, help="number of processes for the admin-1 join (default: one per cpu)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    # Everything is read as text, so the other columns are written back exactly as they were
+    df = pd.read_csv(args.events, delimiter=";", dtype=str, keep_default_na=False, na_values=[""])
+    df["us state"] = locate_us_states(pd.to_numeric(df["Latitude"]), pd.to_numeric(df["Longitude"]), args.boundaries)
+    df[ADMIN1_COLUMN] = join_admin1(df, args.processes)
+    df.to_csv(args.events, sep=";", index=False)
+    print(f'{df["us state"].notna().sum()} of {len(df)} events located in a U.S. state, '
+          f'{df[ADMIN1_COLUMN].notna().sum()} in an admin-1 region in {time.perf_counter() - start:.2f}s')
@@ -0,0 +1,81 @@
+import os
+import hashlib
+import threading
+
+from flask import Response, request, abort, send_file
+from werkzeug.security import safe_join
+
+import boundaries
+
+GEOJSON_DIRECTORY = './Data/GeoJson1'
+ROUTE = '/geojson'
+
+# One year, the urls contain the hash of the file so a changed file gets a new url
+MAX_AGE = 365 * 24 * 60 * 60
+
+# Modification time and content hash of every file that was linked to or requested, one short string per file
+etags = {}
+etags_lock = threading.Lock()
+
+def get_path(filename):
+    path = safe_join(GEOJSON_DIRECTORY, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
+
+def get_etag(path):
+    mtime = os.path.getmtime(path)
+    cached = etags.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as file:
+            cached = (mtime, hashlib.sha1(file.read()).hexdigest())
+        with etags_lock:
+            etags[path] = cached
+    return cached[1]
+
+def get_url(filename):
+    # Url of a file in the GeoJson directory, versioned by its content
+    path = get_path(filename)
+    if path is None:
+        return None
+    return f'{ROUTE}/{filename}?v={get_etag(path)}'
+
+def choose_encoding(path):
+    # The files are compressed by boundaries.py during the build, nothing is compressed while serving.
+    # A compressed file that is older than its source is outdated, then the source is sent as it is.
+    mtime = os.path.getmtime(path)
+    for encoding, extension in boundaries.COMPRESSED_EXTENSIONS.items():
+        compressed = path + extension
+        if request.accept_encodings[encoding] and os.path.exists(compressed) and os.path.getmtime(compressed) >= mtime:
+            return encoding, compressed
+    return "identity", path
+
+def serve_geojson(filename):
+    path = get_path(filename)
+    if path is None:
+        abort(404)
+    content_etag = get_etag(path)
+
+    # Versioned urls never change, others have to be revalidated with the etag
+    if request.args.get("v") == content_etag:
+        cache_control = f'public, max-age={MAX_AGE}, immutable'
+    else:
+        cache_control = 'no-cache'
+
+    # Every encoding is a different representation, so it gets its own strong etag
+    encoding, encoded_path = choose_encoding(path)
+    etag = content_etag if encoding == "identity" else f'{content_etag}-{encoding}'
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = send_file(encoded_path, mimetype='application/geo+json', conditional=False, etag=False)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+def register_routes(server):
+    server.add_url_rule(f'{ROUTE}/<path:filename>', 'geojson', serve_geojson)
@@ -0,0 +1,71 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+import metrics
+
+GEOJSON_DIRECTORY = './Data/GeoJson1'
+
+# Parsed GeoJSON takes several times the size of its file in memory (4 to 9 times for the boundary files),
+# measuring the parsed objects would take longer than parsing them, so the size is estimated from the file
+MEMORY_FACTOR = 8
+# All values loaded from the boundary files share this bound
+MAX_BYTES = int(os.environ.get('GEOMETRY_CACHE_MB', 256)) * 1024 * 1024
+
+# Entries by kind and file name, the least recently used first
+entries = OrderedDict()
+entries_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+
+def get_entry(kind, filename, load):
+    # load(path) returns the value for the file and its size in bytes. The value is shared between all callers,
+    # so it must not be modified.
+    path = os.path.join(GEOJSON_DIRECTORY, filename)
+    mtime = os.path.getmtime(path)
+    key = (kind, filename)
+    with entries_lock:
+        entry = entries.get(key)
+        if entry is not None and entry["mtime"] == mtime:
+            entries.move_to_end(key)
+            stats["hits"] += 1
+            metrics.geometry_cache_requests.labels("hit").inc()
+            return entry["value"]
+
+    value, size = load(path)
+
+    with entries_lock:
+        stats["misses"] += 1
+        metrics.geometry_cache_requests.labels("miss").inc()
+        # A file that changed on disk replaces its outdated entry
+        outdated = entries.pop(key, None)
+        if outdated is not None:
+            stats["bytes"] -= outdated["size"]
+        if size <= MAX_BYTES:
+            entries[key] = {"mtime": mtime, "size": size, "value": value}
+            stats["bytes"] += size
+            while stats["bytes"] > MAX_BYTES:
+                _, evicted = entries.popitem(last=False)
+                stats["bytes"] -= evicted["size"]
+                stats["evictions"] += 1
+                metrics.geometry_cache_requests.labels("eviction").inc()
+        metrics.geometry_cache_size.set(stats["bytes"])
+    return value
+
+def load_geojson(path):
+    with open(path, encoding='utf-8') as file:
+        geojson = json.load(file)
+    return geojson, os.path.getsize(path) * MEMORY_FACTOR
+
+def get_geojson(filename):
+    return get_entry("geojson", filename, load_geojson)
+
+def get_stats():
+    with entries_lock:
+        return {**stats, "entries": len(entries)}
+
+def clear():
+    with entries_lock:
+        entries.clear()
+        stats["bytes"] = 0
+        metrics.geometry_cache_size.set(0)
@@ -0,0 +1,24 @@
+import os
+import shutil
+
+# The app is imported once in the master, which builds the datasets and aggregates before forking the workers
+# (see the end of app.py). The workers share those pages, so adding workers does not add a copy of the data.
+preload_app = True
+os.environ.setdefault("PRELOAD_DATASETS", "1")
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# Building the datasets in the master can take longer than the default timeout on a cold start
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# Every worker writes its metrics to this directory and /metrics combines those of all workers, otherwise a scrape
+# only returns the metrics of the worker that served it. prometheus_client reads the variable when the app is imported,
+# which happens before on_starting with preload_app, so the files of an earlier run are removed here.
+metrics_directory = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_metrics")
+shutil.rmtree(metrics_directory, ignore_errors=True)
+os.makedirs(metrics_directory)
+
+def child_exit(server, worker):
+    # The gauges of a stopped worker are no longer counted
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -6,6 +6,9 @@ from dash_extensions.javascript import arrow_function, assign, Namespace
 from dash_extensions import EventListener
 from dash_iconify import DashIconify
 import util
+import data
+import choropleth
+import components
 
 ns = Namespace("dashExtensions", "default")
 
@@ -21,6 +24,9 @@ climatological_icon = html.Img(
 show_events_button = dbc.Button(
     "Show all events", color="primary", className="me-1 show-events", id="world-show-events")
 
+# The map starts at this zoom level, the world borders are switched to the level of detail of the zoom level in the browser
+WORLD_START_ZOOM = 2
+
 classes = [0, 0.5, 1, 5, 10, 50, 100]
 colorscale = ['#ffffb2', '#fed976', '#feb24c',
               '#fd8d3c', '#fc4e2a', '#e31a1c', '#b10026']
@@ -33,6 +39,11 @@ colorbar = dlx.categorical_colorbar(categories=ctg, colorscale=colorscale,
 country_info = html.Div(id="info_countries", className="map-info", style={
                         "position": "absolute", "top": "10px", "left": "10px", "zIndex": "1000"})
 
+# The hover panel is rendered in the browser, the shares come from the hideout of the map.
+# A hover is only sent to the server if the browser can not render it.
+country_info_table = dcc.Store(id='country-info-table', data=components.get_country_info_table())
+country_info_request = dcc.Store(id='country-info-request')
+
 world_slider = dcc.Slider(min=1960,
                           max=2023,
                           step=1,
@@ -56,6 +67,10 @@ animation_button = dbc.Button(children=[
 animation_interval = dcc.Interval(
     'animation-interval', interval=1000, disabled=True)
 
+# The data of every year for the animation, loaded when it is started, and the year that has to be loaded from the server
+animation_bundle = dcc.Store(id='world-animation-bundle')
+year_request = dcc.Store(id='world-year-request', data=1960)
+
 world_slider_wrapper = EventListener(
     children=[
         dbc.Row(
@@ -71,7 +86,9 @@ world_slider_wrapper = EventListener(
                         world_slider
                     ],
                     className="column"),
-                animation_interval
+                animation_interval,
+                animation_bundle,
+                year_request
             ], className="slider-container")
     ], id="world-slider-wrapper", events=[{"event": "mouseout", "props": ["type"]}, {"event": "mouseover", "props": ["type"]}])
 
@@ -112,183 +129,184 @@ map_legend = html.Div(children=[
     ], className="legend-row-wrapper")
 ])
 
-map = dl.Map(
-    id="map",
-    style={"width": "100%", "height": "100%", "display": "block"},
-    maxBounds=[[-90, -180], [90, 180]],
-    maxBoundsViscosity=1.0,
-    maxZoom=18,
-    minZoom=2,
-    zoom=2,
-    center=(40, -37),
-    bounceAtZoomLimits=True,
-    children=[
-        dl.TileLayer(),
-        # https://datahub.io/core/geo-countries#resource-countries
-        dl.GeoJSON(
-            data=util.get_world_geojson(),
-            id="countries",
-            # Invisible polygons,
-            options=dict(style=ns('draw_countries')),
-            hideout=dict(colorscale=colorscale, classes=classes, style=style,
-                         current_year=1960, ratio_map=util.generate_countries_colours()),
-            hoverStyle=arrow_function(dict(weight=3, color='#666', dashArray=''))),
-        colorbar,
-        country_info,
-        dl.LayersControl(
-            [dl.Overlay(dl.GeoJSON(data={},
-                                   id="events",
-                                   options=dict(pointToLayer=ns("draw_marker"))), name="Events", checked=True)]
-        ),
-        dl.GestureHandling(),
-        world_slider_wrapper,
-        html.Div(id="log")
-    ],
-)
-
 world_gdp_graph = dcc.Graph(
     id="world-gdp-graph", style={"height": "30vh", "width": "100%", "marginTop": "5px"})
 world_affected_graph = dcc.Graph(
     id="world-affected-graph", style={"height": "30vh", "width": "100%", "marginTop": "5px"})
 
-home_layout = html.Div(
-    children=[
-        dbc.Row(
-            children=[
-                dbc.Col(
-                    children=[
-                        dbc.Card(
-                            children=[
-                                dbc.CardHeader(
-                                    children=[
-                                        "World Map"
+def create_home_layout():
+    # The layout is built when the tab is opened, so the app can start before the data is loaded
+    map = dl.Map(
+        id="map",
+        style={"width": "100%", "height": "100%", "display": "block"},
+        maxBounds=[[-90, -180], [90, 180]],
+        maxBoundsViscosity=1.0,
+        maxZoom=18,
+        minZoom=2,
+        zoom=WORLD_START_ZOOM,
+        center=(40, -37),
+        bounceAtZoomLimits=True,
+        children=[
+            dl.TileLayer(),
+            # https://datahub.io/core/geo-countries#resource-countries
+            dl.GeoJSON(
+                url=util.get_world_geojson_url(zoom=WORLD_START_ZOOM),
+                id="countries",
+                # Invisible polygons,
+                options=dict(style=ns('draw_countries')),
+                hideout=dict(colorscale=colorscale, classes=classes, style=style,
+                             current_year=1960, ratio_map=choropleth.encode_ratio_map(data.country_ratios)),
+                hoverStyle=arrow_function(dict(weight=3, color='#666', dashArray=''))),
+            colorbar,
+            country_info,
+            dl.LayersControl(
+                [dl.Overlay(dl.GeoJSON(data={},
+                                       id="events",
+                                       options=dict(pointToLayer=ns("draw_marker"))), name="Events", checked=True)]
+            ),
+            dl.GestureHandling(),
+            world_slider_wrapper,
+            html.Div(id="log")
+        ],
+    )
 
-                                    ]
-                                ),
-                                dbc.CardBody(
-                                    children=[
-                                        dbc.Row(
-                                            children=[
-                                                map_legend
-                                            ],
-                                            style={"height": "10%"}
-                                        ),
-                                        dbc.Row(
-                                            children=[
-                                                map
-                                            ],
-                                            style={
-                                                "height": "90%", "marginRight": "0", "marginLeft": "0"}
-                                        )
-                                    ]
-                                )
-                            ],
-                            className="map-card")
-                    ],
-                    width=9,
-                    className="column map-column"),
-                dbc.Col(
-                    children=[
-                        dbc.Card(
-                            children=[
-                                dbc.CardHeader(
-                                    children=[
-                                        "Aggregated Data"
-                                    ]
-                                ),
-                                dbc.CardBody(
-                                    children=[
-                                        html.Div(
-                                            id="world-aggregated-data"),
-                                        show_events_button
-                                    ]
-                                )
-                            ],
-                            className="aggregated-card")
-                    ],
-                    width=3,
-                    className="column aggregated-column")
-            ],
-            className="map-row"
-        ),
-        dbc.Row(
-            children=[
-                dbc.Col(
-                    children=[
-                        dbc.Card(
-                            children=[
-                                dbc.CardHeader(
-                                    children=[
-                                        "GDP Data"
-                                    ]
-                                ),
-                                dbc.CardBody(
-                                    children=[
-                                        dbc.Tabs(
-                                            children=[
-                                                dbc.Tab(
-                                                    label="Total", tab_id="general"),
-                                                dbc.Tab(
-                                                    label="Disaster Subgroups", tab_id="specific"),
-                                            ],
-                                            id="world-gdp-tabs",
-                                            active_tab="general"
-                                        ),
-                                        world_gdp_graph,
-                                    ],
-                                    className="gdp-cardbody")
-                            ],
-                            className="gdp-card")
-                    ],
-                    width=6,
-                    className="column gdp-column"),
-                dbc.Col(
-                    children=[
-                        dbc.Card(
-                            children=[
-                                dbc.CardHeader(
-                                    children=[
-                                        "Affected Data"
-                                    ]
-                                ),
-                                dbc.CardBody(
-                                    children=[
-                                        dbc.Tabs(
-                                            children=[
-                                                dbc.Tab(
-                                                    label="Total Deaths", tab_id="deaths"),
-                                                dbc.Tab(
-                                                    label="Total Injured", tab_id="injuries"),
-                                                dbc.Tab(
-                                                    label="Total Homeless", tab_id="homeless")
-                                            ],
-                                            id="world-affected-tabs",
-                                            active_tab="deaths"
-                                        ),
-                                        world_affected_graph
-                                    ]
-                                )
-                            ],
-                            className="affected-card")
-                    ],
-                    width=6,
-                    className="column affected-column")
-            ],
-            className="graphs-row"),
-        html.Div(
-            children=[
-                dbc.Offcanvas(
-                    children=[
-                        dbc.Accordion(
-                            id="world-events-accordion"
-                        )
-                    ],
-                    is_open=False,
-                    placement="end",
-                    id="world-offcanvas"
-                )
-            ]
-        )
-    ],
-    id="home"
-)
+    return html.Div(
+        children=[
+            dbc.Row(
+                children=[
+                    dbc.Col(
+                        children=[
+                            dbc.Card(
+                                children=[
+                                    dbc.CardHeader(
+                                        children=[
+                                            "World Map"
+
+                                        ]
+                                    ),
+                                    dbc.CardBody(
+                                        children=[
+                                            dbc.Row(
+                                                children=[
+                                                    map_legend
+                                                ],
+                                                style={"height": "10%"}
+                                            ),
+                                            dbc.Row(
+                                                children=[
+                                                    map
+                                                ],
+                                                style={
+                                                    "height": "90%", "marginRight": "0", "marginLeft": "0"}
+                                            ),
+                                            country_info_table,
+                                            country_info_request,
+                                            dcc.Store(id='world-geojson-urls', data=util.get_world_geojson_urls())
+                                        ]
+                                    )
+                                ],
+                                className="map-card")
+                        ],
+                        width=9,
+                        className="column map-column"),
+                    dbc.Col(
+                        children=[
+                            dbc.Card(
+                                children=[
+                                    dbc.CardHeader(
+                                        children=[
+                                            "Aggregated Data"
+                                        ]
+                                    ),
+                                    dbc.CardBody(
+                                        children=[
+                                            html.Div(
+                                                id="world-aggregated-data"),
+                                            show_events_button
+                                        ]
+                                    )
+                                ],
+                                className="aggregated-card")
+                        ],
+                        width=3,
+                        className="column aggregated-column")
+                ],
+                className="map-row"
+            ),
+            dbc.Row(
+                children=[
+                    dbc.Col(
+                        children=[
+                            dbc.Card(
+                                children=[
+                                    dbc.CardHeader(
+                                        children=[
+                                            "GDP Data"
+                                        ]
+                                    ),
+                                    dbc.CardBody(
+                                        children=[
+                                            dbc.Tabs(
+                                                children=[
+                                                    dbc.Tab(
+                                                        label="Total", tab_id="general"),
+                                                    dbc.Tab(
+                                                        label="Disaster Subgroups", tab_id="specific"),
+                                                ],
+                                                id="world-gdp-tabs",
+                                                active_tab="general"
+                                            ),
+                                            world_gdp_graph,
+                                        ],
+                                        className="gdp-cardbody")
+                                ],
+                                className="gdp-card")
+                        ],
+                        width=6,
+                        className="column gdp-column"),
+                    dbc.Col(
+                        children=[
+                            dbc.Card(
+                                children=[
+                                    dbc.CardHeader(
+                                        children=[
+                                            "Affected Data"
+                                        ]
+                                    ),
+                                    dbc.CardBody(
+                                        children=[
+                                            dbc.Tabs(
+                                                children=[
+                                                    dbc.Tab(
+                                                        label="Total Deaths", tab_id="deaths"),
+                                                    dbc.Tab(
+                                                        label="Total Injured", tab_id="injuries"),
+                                                    dbc.Tab(
+                                                        label="Total Homeless", tab_id="homeless")
+                                                ],
+                                                id="world-affected-tabs",
+                                                active_tab="deaths"
+                                            ),
+                                            world_affected_graph
+                                        ]
+                                    )
+                                ],
+                                className="affected-card")
+                        ],
+                        width=6,
+                        className="column affected-column")
+                ],
+                className="graphs-row"),
+            html.Div(
+                children=[
+                    dbc.Offcanvas(
+                        children=components.create_events_list("world"),
+                        is_open=False,
+                        placement="end",
+                        id="world-offcanvas"
+                    )
+                ]
+            )
+        ],
+        id="home"
+    )
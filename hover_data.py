@@ -0,0 +1,35 @@
+import fema_aggregates
+
+# The text shown in the hover panels is looked up in these tables, both in the browser and by the server fallback
+
+def format_state_share(value, total):
+    return "{:.3f}%".format((value / total) * 100)
+
+def get_state_names(usa_states_data):
+    return [feature["properties"]["NAME_1"] for feature in usa_states_data["features"]]
+
+def build_state_spent_texts(usa_states_data, fema):
+    # Share of the U.S. mitigation spending of every state
+    states_spending = fema_aggregates.get_states_spending(fema)
+    total_spent = fema_aggregates.get_total_spent(fema)
+    return {name: format_state_share(states_spending.get(name, 0), total_spent) for name in get_state_names(usa_states_data)}
+
+def build_state_damages_texts(usa_states_data, fema):
+    # Share of the U.S. damages of every state
+    total_damages = fema_aggregates.get_total_damages(fema)
+    return {name: format_state_share(fema_aggregates.get_total_damages_state(fema, name), total_damages)
+            for name in get_state_names(usa_states_data)}
+
+def get_state_text(texts, state_name):
+    # States without any data have a share of 0
+    return texts.get(state_name, "0.000%")
+
+def get_country_text(ratio_matrix, year, iso):
+    # The world map already has the shares of every year in its hideout, the browser formats them the same way
+    if year not in ratio_matrix.index or iso not in ratio_matrix.columns:
+        return "0"
+    return repr(float(ratio_matrix.loc[year, iso]))
+
+def create_hover_table(header, placeholder, texts = None):
+    # Everything the browser needs to render a hover panel, the texts of the countries are in the hideout of the map
+    return {"header": header, "placeholder": placeholder, "texts": texts}
@@ -8,6 +8,7 @@ from converter import abbrev_to_us_state
 import colorsys
 import locale
 import data
+import fema_aggregates
 
 locale.setlocale(locale.LC_ALL, '')
 
@@ -60,47 +61,31 @@ app.layout = html.Div([
     # dcc.Graph(figure=px.line(df_disasters_us_states, 'Start Year', 'Total Damages, Adjusted (\'000 US$)', color='us state'))
 ],style={'width': '100vw', 'height': '100vh'})
 
-def generate_aggregated_data(df_states: pd.DataFrame, df_disasters, year, state=None):
-    df_states_year_program = df_states.groupby(['programFy', 'programArea'], as_index=False).sum(numeric_only=True)
-    df_states_year_program = df_states_year_program[df_states_year_program['programFy'] == year]
+def generate_aggregated_data(fema, year, state=None):
+    program_spending = fema_aggregates.get_program_spending(fema, year, state)
 
-    df_states_year_program.sort_values(by='actualAmountPaid',inplace=True, ascending=False)
-
-    programs = [html.P(f'{program["programArea"]} - {locale.currency(program["actualAmountPaid"], grouping=True)}') for _,program in df_states_year_program.head(5).iterrows()]
+    programs = [html.P(f'{program} - {locale.currency(amount, grouping=True)}') for program, amount in program_spending.head(5).items()]
 
     return html.Div(children=[html.H5('Top 5 funded programs'), *programs])
 
 
 @app.callback([Output('countries', 'hideout'), Output('aggregated-data', 'children')], Input('slider','value'), State('countries', 'data'))
 def slider_callback(value, country_data):
-
-    df_disasters = pd.read_csv('./Data/Preprocessed-Natural-Disasters.csv', delimiter=';')
-    df_disasters_us = df_disasters[df_disasters['ISO'] == 'USA']
-    # df_disasters_us = util.filter_map_events(df_disasters_us, {'Disaster Subgroup': 'Hydrological'})
-    df_disasters_us_states = df_disasters_us.groupby(['Start Year', 'us state'], as_index=False).sum(numeric_only=True)
-
-    total_costs = data.df_properties[data.df_properties['programFy'] == value].sum(numeric_only=True)['actualAmountPaid']
-
-    # states = df_properties[df_properties['programArea'] == 'FMA']
-    states = data.df_properties.groupby(['programFy', 'state'], as_index=False).sum(numeric_only=True)
-
-    spent = states[states['programFy'] == value]
-    costs = df_disasters_us_states[df_disasters_us_states['Start Year'] <= value]
-
-    # spent = spent[spent['programArea'] == 'FMA'] # get all data about flood prevention
-    # costs = costs[costs['Disaster Subgroup'] == 'Hydrological'] # get all hydrological events
+    # Spending of every state in the year and damages of every state up to the year, from the precomputed totals
+    spent = fema_aggregates.get_spending_per_state(data.fema_cube, value)
+    costs = fema_aggregates.get_damages_per_state(data.fema_cube, value)
 
     features = country_data['features']
     state_iso_original = [feature['properties']['ISO_1'] for feature in features]
     state_iso = [name.split('-')[1] for name in state_iso_original]
     state_names = [abbrev_to_us_state[abbrev] for abbrev in state_iso]
 
-    children = generate_aggregated_data(data.df_properties, df_disasters, value)
+    children = generate_aggregated_data(data.fema_cube, value)
     state_map = {}
     for idx,state in enumerate(state_names):
         id = state_iso_original[idx]
-        spent_state = sum(spent[spent['state'] == state]['actualAmountPaid'].values,start=0)
-        costs_state = sum(costs[costs['us state'] == state]['Total Damages, Adjusted (\'000 US$)'].values, start=0)
+        spent_state = spent.get(state, 0)
+        costs_state = costs.get(state, 0)
 
         # print(f'state: {state} spent: {spent_state} of the total: {total_costs}')
 
@@ -131,13 +116,9 @@ def on_state_click(n_clicks, state, value):
     iso = state_iso.split('-')[1]
     state_name = abbrev_to_us_state[iso]
 
-    state_data = data.df_properties[(data.df_properties['programFy'] == value) & (data.df_properties['state'] == state_name)]
-    total_spent = state_data.sum(numeric_only=True)['actualAmountPaid']
-
-    grouped_state_data = state_data.groupby(['programArea'], as_index=False).sum(numeric_only=True)
-    grouped_state_data.sort_values(by=['actualAmountPaid'], ascending=False, inplace=True)
+    program_spending = fema_aggregates.get_program_spending(data.fema_cube, value, state_name)
 
-    programs = [html.P(f'{program["programArea"]} - {locale.currency(program["actualAmountPaid"], grouping=True)}') for _,program in grouped_state_data.head(5).iterrows()]
+    programs = [html.P(f'{program} - {locale.currency(amount, grouping=True)}') for program, amount in program_spending.head(5).items()]
 
     return html.Div(children=[html.H5(f'Top 5 funded programs - {state_name}'), *programs])
 
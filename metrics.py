@@ -0,0 +1,109 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from flask import Response, request, g, abort
+from prometheus_client import Histogram, Gauge, Counter, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+
+import data
+
+ROUTE = '/metrics'
+DASH_CALLBACK_ROUTE = '/_dash-update-component'
+
+# The metrics are only served to a scraper on the same machine, behind the proxy of the host every request
+# comes from the address of the proxy
+LOCAL_ADDRESSES = {'127.0.0.1', '::1'}
+
+# Under gunicorn every worker writes its samples to this directory, and /metrics combines those of all workers
+# (see gunicorn.conf.py)
+MULTIPROCESS_DIRECTORY = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 256 bytes up to 16 MB
+SIZE_BUCKETS = tuple(4 ** exponent for exponent in range(4, 13))
+
+# Every Dash callback is served by the same route, its output id tells which callback it was. Only the outputs of
+# registered callbacks are used as label, so clients cannot add labels. The ids of pattern-matching outputs contain
+# the wildcard, not the matched values.
+callback_latency = Histogram('dash_callback_duration_seconds', 'Time to run a Dash callback', ['output'], buckets=LATENCY_BUCKETS)
+callback_response_size = Histogram('dash_callback_response_bytes', 'Size of the response of a Dash callback', ['output'], buckets=SIZE_BUCKETS)
+callback_request_size = Histogram('dash_callback_request_bytes', 'Size of the inputs and states sent to a Dash callback', ['output'], buckets=SIZE_BUCKETS)
+request_latency = Histogram('http_request_duration_seconds', 'Time to handle the other requests', ['endpoint'], buckets=LATENCY_BUCKETS)
+
+# Counted by the caches themselves, so the counts of all workers add up
+figure_cache_requests = Counter('figure_cache_requests', 'Figures requested from the figure cache', ['result'])
+# Results are "hit" and "miss" for every lookup, and "eviction" for every entry the geometry cache drops
+geometry_cache_requests = Counter('geometry_cache_requests', 'Lookups and evictions of the geometry cache', ['result'])
+geometry_cache_size = Gauge('geometry_cache_bytes', 'Estimated memory used by the geometry cache', multiprocess_mode='livesum')
+
+# Set when /metrics is requested, the datasets are loaded before the workers are forked so all workers have the same values
+dataset_memory = Gauge('dataset_memory_bytes', 'Memory used by a loaded dataset or aggregate', ['dataset'], multiprocess_mode='max')
+dataset_load_time = Gauge('dataset_load_seconds', 'Time it took to build a dataset or aggregate', ['dataset'], multiprocess_mode='max')
+
+# The datasets do not change once they are loaded, so their memory is only measured once
+memory_usage = {}
+
+def get_memory_usage(value):
+    # Memory of the dataframes, series and arrays of a value, None for values that contain none of them
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        sizes = [size for size in map(get_memory_usage, value.values()) if size is not None]
+        return sum(sizes) if sizes else None
+    return None
+
+def update_gauges():
+    for name in data.registry:
+        if not data.is_loaded(name):
+            continue
+        if name not in memory_usage:
+            memory_usage[name] = get_memory_usage(data.get(name))
+        if memory_usage[name] is not None:
+            dataset_memory.labels(name).set(memory_usage[name])
+        dataset_load_time.labels(name).set(data.load_timings[name])
+
+def start_timer():
+    g.metrics_start = time.perf_counter()
+
+def get_output_label(callback_map):
+    # Dash has already parsed the body, so this does not parse it again
+    body = request.get_json(silent=True)
+    output = body.get('output') if isinstance(body, dict) else None
+    return output if output in callback_map else 'unknown'
+
+def observe(response, callback_map):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    duration = time.perf_counter() - start
+
+    if request.path.endswith(DASH_CALLBACK_ROUTE):
+        output = get_output_label(callback_map)
+        callback_latency.labels(output).observe(duration)
+        callback_request_size.labels(output).observe(request.content_length or 0)
+        if not response.direct_passthrough:
+            callback_response_size.labels(output).observe(len(response.get_data()))
+    elif request.path != ROUTE:
+        request_latency.labels(request.endpoint or 'unknown').observe(duration)
+    return response
+
+def get_metrics():
+    if request.remote_addr not in LOCAL_ADDRESSES:
+        abort(404)
+    update_gauges()
+    if MULTIPROCESS_DIRECTORY:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+def register_routes(server, callback_map):
+    # The callback map of the Dash app is filled when the callbacks are registered, after this is called
+    server.before_request(start_timer)
+    server.after_request(lambda response: observe(response, callback_map))
+    server.add_url_rule(ROUTE, 'metrics', get_metrics)
@@ -9,12 +9,33 @@ import util
 
 import converter as converter
 import components
+import hover_data
 
 ns = Namespace('dashExtensions', 'default')
 
-death_graph = dcc.Graph(id='death_graph', figure=components.generate_average_death_comparison_bar_plot(data.df_disasters))
+@data.register("usa_states_data")
+def load_usa_states_data():
+    return util.get_country_data('USA')
 
-usa_states_data = util.get_country_data('USA')
+@data.register("states_spent_ratio", ["usa_states_data", "fema_cube"])
+def build_states_spent_ratio(usa_states_data, fema_cube):
+    return util.generate_states_spent_ratio(usa_states_data, fema_cube)
+
+@data.register("states_damages_ratio", ["usa_states_data", "fema_cube"])
+def build_states_damages_ratio(usa_states_data, fema_cube):
+    return util.generate_states_damages_ratio(usa_states_data, fema_cube)
+
+@data.register("state_spent_texts", ["usa_states_data", "fema_cube"])
+def build_state_spent_texts(usa_states_data, fema_cube):
+    return hover_data.build_state_spent_texts(usa_states_data, fema_cube)
+
+@data.register("state_damages_texts", ["usa_states_data", "fema_cube"])
+def build_state_damages_texts(usa_states_data, fema_cube):
+    return hover_data.build_state_damages_texts(usa_states_data, fema_cube)
+
+@data.register("average_death_figure", ["df_disasters"])
+def build_average_death_figure(df_disasters):
+    return components.generate_average_death_comparison_bar_plot(df_disasters)
 
 classes = [0,5,10,15,20,25]
 colorscale = ['#ffffb2', '#fed976', '#feb24c', '#fd8d3c', '#f03b20', '#bd0026']
@@ -25,131 +46,144 @@ colorbar = dlx.categorical_colorbar(categories=ctg, colorscale=colorscale, width
 state_info = html.Div(id="info", className="map-info", style={"position": "absolute", "top": "10px", "right": "10px", "zIndex": "1000"})
 state_damages_info = html.Div(id="damages_info", className="map-info", style={"position": "absolute", "top": "10px", "right": "10px", "zIndex": "1000"})
 
-map1 = dl.Map(
-    maxBounds=[[-90, -180], [90, 180]],
-    maxBoundsViscosity=1.0,
-    maxZoom=18,
-    minZoom=2,
-    zoom=10,
-    center=(40.5545549008774, -102.17859725490524),
-    bounceAtZoomLimits=True,
-    children=[
-        dl.TileLayer(),
-        # https://datahub.io/core/geo-countries#resource-countries
-        dl.GeoJSON(
-            data=usa_states_data,
-            id="usa-states-1",
-            hideout=dict(colorscale=colorscale,classes=classes,style=style,active_state='',ratio_map=util.generate_states_spent_ratio(usa_states_data,data.df_properties)),
-            # Invisible polygons,
-            options=dict(style = ns('draw_polygon')),
-            zoomToBounds=True,
-            hoverStyle=arrow_function(dict(weight=2, color='#666', dashArray=''))),  # Gray border on hover (line_thickness, color, line_style)
-        colorbar,
-        state_info
-    ],
-    style={"width": "100%", "height": "100%", "display": "block"},
-    id="usa-map-1")
-
-map2 = dl.Map(
-    maxBounds=[[-90, -180], [90, 180]],
-    maxBoundsViscosity=1.0,
-    maxZoom=18,
-    minZoom=2,
-    zoom=10,
-    center=(40.5545549008774, -102.17859725490524),
-    bounceAtZoomLimits=True,
-    children=[
-        dl.TileLayer(),
-        # https://datahub.io/core/geo-countries#resource-countries
-        dl.GeoJSON(
-            data=usa_states_data,
-            id="usa-states-2",
-            hideout=dict(colorscale=colorscale,classes=classes,style=style,active_state='',ratio_map=util.generate_states_damages_ratio(usa_states_data,data.df_disasters)),
-            # Invisible polygons,
-            options=dict(style = ns('draw_polygon')),
-            zoomToBounds=True,
-            hoverStyle=arrow_function(dict(weight=2, color='#666', dashArray=''))),  # Gray border on hover (line_thickness, color, line_style)
-        colorbar,
-        state_damages_info
-    ],
-    style={"width": "100%", "height": "100%", "display": "block"},
-    id="usa-map-2")
-
-
-us_layout = html.Div(id='us_layout', children=[
-    dbc.Row(
-        children=[
-            dbc.Col(
-                children=[
-                    dbc.Card(
-                        children=[
-                            dbc.CardHeader(children=["USA Map - Mitigation ratio's"]),
-                            dbc.CardBody(children=map1)
-                        ],
-                        className='map-card'
-                    )
-                ],
-                width=6,
-                className="column us-map-column gdp-column mit-map"
-            ),
-            dbc.Col(children=[
-                    dbc.Card(
-                        children=[
-                            dbc.CardHeader(children=["USA Map - Damage ratio's"]),
-                            dbc.CardBody(children=map2)
-                        ],
-                        className='map-card'
-                    )
-                ],
-                width=6,
-                className="column us-map-column affected-column"
-            ),
-        ],
-        className="map-row us-map-row",
-    ),
-    dbc.Row(
+# The hover panels are rendered in the browser from these tables, a hover is only sent to the server if it is not in them
+state_info_request = dcc.Store(id='info-request')
+state_damages_info_request = dcc.Store(id='damages-info-request')
+
+# Code of the state that is selected on the mitigation map, per browser session
+selected_state = dcc.Store(id='us-selected-state', storage_type='session')
+
+def create_us_layout():
+    # The layout is built when the tab is opened, so the FEMA data is only loaded when it is needed
+    death_graph = dcc.Graph(id='death_graph', figure=data.average_death_figure)
+    state_info_table = dcc.Store(id='info-table', data=components.get_state_info_table(data.state_spent_texts))
+    state_damages_info_table = dcc.Store(id='damages-info-table', data=components.get_state_damages_info_table(data.state_damages_texts))
+
+    map1 = dl.Map(
+        maxBounds=[[-90, -180], [90, 180]],
+        maxBoundsViscosity=1.0,
+        maxZoom=18,
+        minZoom=2,
+        zoom=10,
+        center=(40.5545549008774, -102.17859725490524),
+        bounceAtZoomLimits=True,
         children=[
-            dbc.Col(
-                children=[
-                    dbc.Card(
-                        children=[
-                            dbc.CardHeader("Mitigation cost distribution U.S.", id="us-cost-distribution-mitigations-header"),
-                            dbc.CardBody(children=[html.Div(id="us-cost-distribution-mitigations")])
-                        ]
-                    )
-                ],
-                className="column gdp-column",
-                width=6
-            ),
-            dbc.Col(
-                children=[
-                    dbc.Card(
-                        children=[
-                            dbc.CardHeader("Damage distribution over disaster subgroups U.S.", id="us-cost-distribution-subgroups-header"),
-                            dbc.CardBody(children=[html.Div(id="us-cost-distribution-subgroups")])
-                        ]
-                    )
-                ],
-                className="column affected-column",
-                width=6
-            ),
+            dl.TileLayer(),
+            # https://datahub.io/core/geo-countries#resource-countries
+            dl.GeoJSON(
+                url=util.get_country_data_url('USA'),
+                id="usa-states-1",
+                hideout=dict(colorscale=colorscale,classes=classes,style=style,active_state='',ratio_map=data.states_spent_ratio),
+                # Invisible polygons,
+                options=dict(style = ns('draw_polygon')),
+                zoomToBounds=True,
+                hoverStyle=arrow_function(dict(weight=2, color='#666', dashArray=''))),  # Gray border on hover (line_thickness, color, line_style)
+            colorbar,
+            state_info
         ],
-        className="graphs-row us-graphs-row"
-    ),
-    dbc.Row(
+        style={"width": "100%", "height": "100%", "display": "block"},
+        id="usa-map-1")
+
+    map2 = dl.Map(
+        maxBounds=[[-90, -180], [90, 180]],
+        maxBoundsViscosity=1.0,
+        maxZoom=18,
+        minZoom=2,
+        zoom=10,
+        center=(40.5545549008774, -102.17859725490524),
+        bounceAtZoomLimits=True,
         children=[
-            dbc.Col(
-                children=[
-                    dbc.Card(
-                        children=[
-                            dbc.CardHeader('Comparison of deaths before and after Fema intervention'),
-                            dbc.CardBody(children=[death_graph])
-                        ]
-                    )       
-                ],
-                width=12,
-                className='column fema-column'
-            )
+            dl.TileLayer(),
+            # https://datahub.io/core/geo-countries#resource-countries
+            dl.GeoJSON(
+                url=util.get_country_data_url('USA'),
+                id="usa-states-2",
+                hideout=dict(colorscale=colorscale,classes=classes,style=style,active_state='',ratio_map=data.states_damages_ratio),
+                # Invisible polygons,
+                options=dict(style = ns('draw_polygon')),
+                zoomToBounds=True,
+                hoverStyle=arrow_function(dict(weight=2, color='#666', dashArray=''))),  # Gray border on hover (line_thickness, color, line_style)
+            colorbar,
+            state_damages_info
         ],
-        className="graphs-row us-graphs-row")
-])
\ No newline at end of file
+        style={"width": "100%", "height": "100%", "display": "block"},
+        id="usa-map-2")
+
+
+    return html.Div(id='us_layout', children=[
+        dbc.Row(
+            children=[
+                dbc.Col(
+                    children=[
+                        dbc.Card(
+                            children=[
+                                dbc.CardHeader(children=["USA Map - Mitigation ratio's"]),
+                                dbc.CardBody(children=[map1, state_info_table, state_info_request, selected_state])
+                            ],
+                            className='map-card'
+                        )
+                    ],
+                    width=6,
+                    className="column us-map-column gdp-column mit-map"
+                ),
+                dbc.Col(children=[
+                        dbc.Card(
+                            children=[
+                                dbc.CardHeader(children=["USA Map - Damage ratio's"]),
+                                dbc.CardBody(children=[map2, state_damages_info_table, state_damages_info_request])
+                            ],
+                            className='map-card'
+                        )
+                    ],
+                    width=6,
+                    className="column us-map-column affected-column"
+                ),
+            ],
+            className="map-row us-map-row",
+        ),
+        dbc.Row(
+            children=[
+                dbc.Col(
+                    children=[
+                        dbc.Card(
+                            children=[
+                                dbc.CardHeader("Mitigation cost distribution U.S.", id="us-cost-distribution-mitigations-header"),
+                                dbc.CardBody(children=[html.Div(id="us-cost-distribution-mitigations")])
+                            ]
+                        )
+                    ],
+                    className="column gdp-column",
+                    width=6
+                ),
+                dbc.Col(
+                    children=[
+                        dbc.Card(
+                            children=[
+                                dbc.CardHeader("Damage distribution over disaster subgroups U.S.", id="us-cost-distribution-subgroups-header"),
+                                dbc.CardBody(children=[html.Div(id="us-cost-distribution-subgroups")])
+                            ]
+                        )
+                    ],
+                    className="column affected-column",
+                    width=6
+                ),
+            ],
+            className="graphs-row us-graphs-row"
+        ),
+        dbc.Row(
+            children=[
+                dbc.Col(
+                    children=[
+                        dbc.Card(
+                            children=[
+                                dbc.CardHeader('Comparison of deaths before and after Fema intervention'),
+                                dbc.CardBody(children=[death_graph])
+                            ]
+                        )       
+                    ],
+                    width=12,
+                    className='column fema-column'
+                )
+            ],
+            className="graphs-row us-graphs-row")
+    ])
\ No newline at end of file
@@ -1,58 +1,43 @@
 import pandas as pd
-from pandas_geojson import to_geojson
 import shapely
 import json
-from geopy.geocoders import Nominatim
-import zipcodes
 from converter import abbrev_to_us_state, us_state_to_abbrev, fema_action_to_disaster
 import matplotlib as mpl
-import data
-
-geolocator = Nominatim(user_agent='geoapiExercises')
-
-def generate_countries_colours():
-    years = list(range(1960,2024))
-    colour_map = {}
-    for year in years:
-        df = data.df_gdp[data.df_gdp['Start Year'] == year].groupby('ISO').sum(numeric_only=True)
-        country_names = df.index
-        colour_countries = {}
-        for country_name in country_names:
-            value = df.loc[country_name, "share"]
-            colour_countries[country_name] = value
-        colour_map[year] = colour_countries       
-    return colour_map
-
-def filter_events(df, filters, location_important = False):
-    data = df
-    if location_important:
-        data = df[df["Latitude"].notnull() & df["Longitude"].notnull()]
-    for filter in filters:
-        data = data[data[filter] == filters[filter]]
-    return data
+import boundaries
+import geojson_server
+import geometry_cache
+import fema_aggregates
+import geocoding
+
 
 def get_events_without_location(df: pd.DataFrame):
     data = df[df['Latitude'].isnull() & df['Longitude'].isnull()]
     return data
 
-def convert_events_to_geojson(df):
-    geojson = to_geojson(df=df, lat="Latitude", lon="Longitude", properties=[
-                         "Dis No", "Disaster Subgroup"])  # More things can be included in the properties when it's needed
-    for event in geojson["features"]:
-        event["properties"]["tooltip"] = df[df["Dis No"] ==
-                                            event["properties"]["Dis No"]]["Disaster Type"].values[0]
-    return geojson
-
 def __get_geojson_data(filename):
-    file = open(f'./Data/GeoJson1/{filename}', encoding='utf-8')
-    geojson = json.load(file)
-    return geojson
+    # Parsed once and then kept in a bounded cache, the result must not be modified
+    return geometry_cache.get_geojson(filename)
+
+def __get_boundaries_file(name, zoom, default):
+    # Use the simplified variant for the zoom level if it has been generated
+    lod_file = boundaries.get_lod_file(name, zoom) if zoom is not None else None
+    return lod_file or default
+
+def get_world_geojson(zoom = None):
+    return __get_geojson_data(__get_boundaries_file('countries', zoom, boundaries.get_source_filename('countries')))
 
-def get_world_geojson():
-    return __get_geojson_data('countries.json')
+def get_world_geojson_url(zoom = None):
+    return geojson_server.get_url(__get_boundaries_file('countries', zoom, boundaries.get_source_filename('countries')))
 
-def get_country_data(country_code):
-    return __get_geojson_data(f'{country_code}.json_opt.json')
+def get_world_geojson_urls():
+    # Url of the world borders for every level of detail
+    return {level: get_world_geojson_url(level) for level in boundaries.ZOOM_LEVELS}
+
+def get_country_data(country_code, zoom = None):
+    return __get_geojson_data(__get_boundaries_file(country_code, zoom, f'{country_code}.json_opt.json'))
+
+def get_country_data_url(country_code, zoom = None):
+    return geojson_server.get_url(__get_boundaries_file(country_code, zoom, f'{country_code}.json_opt.json'))
 
 def get_property(event, property):
     name = event[property]
@@ -68,37 +53,14 @@ def get_date(event):
         return f'{int(month)}/{int(year)}'
     return f'{int(day)}/{int(month)}/{int(year)}'
 
-def get_event(df: pd.DataFrame, event_id):
-    event = df[df['Dis No'] == event_id].iloc[0]
-    print(f'event: {event}')
-    lat = event['Latitude']
-    long = event['Longitude']
-    if (pd.isna(lat) or pd.isna(long)):
-        return event, None
-    else:
-        return event, [lat, long]
-
 def calculate_center(data):
     shapely_geos = shapely.from_geojson(json.dumps(data))
     center = shapely_geos.centroid
     return center
 
 def lat_long_to_state(lat,long):
-    try:
-        location = geolocator.reverse(f'{lat}, {long}')
-    except:
-        return None
-    if (not location):
-        return None
-    address = location.raw['address']
-    zip_code = address.get('postcode')
-    state = address.get('state')
-    if (state):
-        return state
-    if (not zip_code):
-        return None
-    abrev = zipcodes.matching(f'{zip_code}')[0]['state']
-    return abbrev_to_us_state[abrev]
+    # Looked up in the polygons of the U.S. states, without a geocoding service
+    return geocoding.lat_long_to_state(lat, long)
 
 def ratio_to_gradient(ratio):
     colour_map = mpl.colormaps['YlOrRd'].resampled(8)
@@ -125,72 +87,20 @@ def format_large_number(number, float = True):
         return f"{number:,.0f}"
     
 
-def get_state_spending(state, df_properties):
-    if (state):
-        state_properties = df_properties[(df_properties['state'] == state)]
-    else:
-        state_properties = df_properties
-
-    state_properties_grouped = state_properties.groupby(['programArea'], as_index=False).sum(numeric_only=True)
-
-    different_programs = ['FMA','HMGP', 'LPDM', 'PDM', 'RFC', 'SRL']
-    state_spending_map = {}
-    total_spending = 0
-    for program in different_programs:
-        amount_spent = state_properties_grouped[state_properties_grouped['programArea'] == program]['actualAmountPaid'].values
-        if (len(amount_spent) > 0):
-            amount_spent = amount_spent[0]
-        else:
-            amount_spent = 0
-        state_spending_map[program] = amount_spent
-        total_spending += amount_spent
-    state_spending_map['total'] = total_spending
-
-    return state_spending_map
-
-def get_total_spent(df_properties):
-    total_properties = df_properties.sum(numeric_only=True)
-    total_spent = total_properties['actualAmountPaid']
-    return total_spent
-
-def get_total_damages(df_disasters):
-    return df_disasters[(df_disasters['ISO'] == 'USA') & (df_disasters['us state'].notna())].sum(numeric_only=True)["Total Damages, Adjusted ('000 US$)"]
-
-def get_total_damages_state(df_disasters, state_name):
-    return df_disasters[(df_disasters['ISO'] == 'USA') & (df_disasters['us state'] == state_name)].sum(numeric_only=True)["Total Damages, Adjusted ('000 US$)"]
-
-def get_disaster_and_fema_cost_distribution_per_state(state,df_properties, df_disasters):
-    if (state):
-        state_disaster_info = df_disasters[df_disasters['us state'] == state]
-        state_fema_info = df_properties[df_properties['state'] == state]
-    else:
-        state_disaster_info = df_disasters
-        state_fema_info = df_properties
+def get_state_spending(state, fema):
+    return fema_aggregates.get_state_spending(fema, state)
 
-    state_disaster_grouped = state_disaster_info.groupby(['Disaster Subgroup'], as_index=False).sum(numeric_only=True)
-    state_fema_grouped = state_fema_info.groupby(['propertyAction'], as_index=False).sum(numeric_only=True)
+def get_total_spent(fema):
+    return fema_aggregates.get_total_spent(fema)
 
-    disaster_subgroups = state_disaster_grouped['Disaster Subgroup'].values
-    fema_actions = state_fema_grouped['propertyAction'].values
+def get_total_damages(fema):
+    return fema_aggregates.get_total_damages(fema)
 
-    disaster_subgroup_map = {}
-    fema_action_map = {}
+def get_total_damages_state(fema, state_name):
+    return fema_aggregates.get_total_damages_state(fema, state_name)
 
-    for disaster_subgroup in disaster_subgroups:
-        spent_on_disaster = sum(state_disaster_grouped[state_disaster_grouped['Disaster Subgroup'] == disaster_subgroup]["Total Damages, Adjusted ('000 US$)"], 0)
-        if (spent_on_disaster > 0):
-            disaster_subgroup_map[disaster_subgroup] = spent_on_disaster
-    
-    for fema_action in fema_actions:
-        spent_on_action = sum(state_fema_grouped[state_fema_grouped['propertyAction'] == fema_action]['actualAmountPaid'], 0)
-        if (fema_action in fema_action_to_disaster):
-            to_prevent_disaster = fema_action_to_disaster[fema_action]
-        else:
-            continue
-        if (spent_on_action > 0):
-            fema_action_map[fema_action] = [spent_on_action, to_prevent_disaster]
-    
-    return disaster_subgroup_map, fema_action_map
+def get_disaster_and_fema_cost_distribution_per_state(state, distributions):
+    return fema_aggregates.get_cost_distribution(distributions, state)
 
 def compare_deaths_before_and_after_fema(df_disasters):
     fema_date = 1989
@@ -201,36 +111,17 @@ def compare_deaths_before_and_after_fema(df_disasters):
 
     return before_fema,after_fema
 
-def generate_states_spent_ratio(data,df_properties):
+def generate_states_spent_ratio(data, fema):
     features = data['features']
     state_iso_original = [feature['properties']['ISO_1'] for feature in features]
-    state_iso = [name.split('-')[1] for name in state_iso_original]
-    state_names = [abbrev_to_us_state[abbrev] for abbrev in state_iso]
-
-    colour_map = {}
-    for idx,state_name in enumerate(state_names):
-        id = state_iso_original[idx]
-        state_spending = get_state_spending(state_name,df_properties)
-        total_spent_state = state_spending['total']
-        total_spent_us = get_total_spent(df_properties)
-        total_spent_us = max(total_spent_us, 1)
-        colour_map[id] = (total_spent_state/total_spent_us) * 100
-    return colour_map
-
-def generate_states_damages_ratio(data, df_disasters):
-    features = data['features']
-    state_iso_original = [feature['properties']['ISO_1'] for feature in features]
-    state_iso = [name.split('-')[1] for name in state_iso_original]
-    state_names = [abbrev_to_us_state[abbrev] for abbrev in state_iso]
-
-    us_damages = get_total_damages(df_disasters)
-
-    grouped = df_disasters[(df_disasters['ISO'] == 'USA') & (df_disasters['us state'].notna())].groupby('us state').sum(numeric_only=True)
-    grouped['ratio'] = (grouped["Total Damages, Adjusted ('000 US$)"] / us_damages) * 100
-    state_names = grouped.index
-    colour_map = {}
-    for _,state_name in enumerate(state_names):
-        id = f'US-{us_state_to_abbrev[state_name]}'
-        ratio = grouped.loc[state_name,'ratio']
-        colour_map[id] = ratio
-    return colour_map
\ No newline at end of file
+    state_names = [abbrev_to_us_state[name.split('-')[1]] for name in state_iso_original]
+
+    # The spending of all states is looked up at once instead of filtering the properties per state
+    states_spending = fema_aggregates.get_states_spending(fema)
+    total_spent_us = max(get_total_spent(fema), 1)
+    return {id: (states_spending.get(state_name, 0) / total_spent_us) * 100 for id, state_name in zip(state_iso_original, state_names)}
+
+def generate_states_damages_ratio(data, fema):
+    us_damages = get_total_damages(fema)
+    state_damages = fema["state_damages"]
+    return {f'US-{us_state_to_abbrev[state_name]}': (damages / us_damages) * 100 for state_name, damages in state_damages.items()}